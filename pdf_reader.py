@@ -1,13 +1,83 @@
+import time
+STARTUP_T0 = time.perf_counter()  # taken before any other import, for the startup report
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog, Menu, ttk
-import fitz  # PyMuPDF
-from PIL import Image, ImageTk, ImageDraw
 import json
+import gzip
+import io
 import os
+import re
+import sys
+import glob
+import tempfile
+import hashlib
+import sqlite3
+import argparse
+import importlib
+import queue
+import itertools
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+
+# --- Lazy Imports ---
+class LazyModule:
+    """Stands in for a module until an attribute is first used, so PyMuPDF (~200 ms) and
+    Pillow are imported after the window is up, or never for commands that don't need them"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None: self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+fitz = LazyModule("fitz")  # PyMuPDF
+Image = LazyModule("PIL.Image")
+ImageTk = LazyModule("PIL.ImageTk")  # only for comparison in the benchmarks
+futures = LazyModule("concurrent.futures")  # process pools: rendering, bulk split, export, watch service
+multiprocessing = LazyModule("multiprocessing")
+# Only the benchmark suite, the watch service and disk cache pruning need these
+resource = LazyModule("resource")  # peak memory fallback, Unix only
+platform = LazyModule("platform")
+random = LazyModule("random")
+shutil = LazyModule("shutil")
+signal = LazyModule("signal")
+fcntl = LazyModule("fcntl")  # watch service instance locks, Unix only
 
 # --- Configuration & Theme ---
-HISTORY_FILE = "pdf_history.json"
+HISTORY_FILE = "pdf_history.json"  # legacy store, imported once into the database
 ICON_PATH = "icon.ico"
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pdf_reader_cache")
+HISTORY_DB = os.path.join(CACHE_DIR, "history.db")
+HISTORY_LIMIT = 20_000  # documents remembered; the least recently opened are pruned
+RENDER_CACHE_MB = 256  # memory budget for rendered pages kept across zoom/scroll changes
+THUMB_CACHE_MB = 256  # on-disk thumbnails (CACHE_DIR/thumbs), least recently opened documents go first
+TEXT_CACHE_MB = 128  # on-disk search indexes (CACHE_DIR/text), same policy
+TILE_SIZE = 512  # px, edge of one tile when a page is rendered in pieces
+TILE_PAGE_PIXELS = 4_000_000  # pages bigger than this at the current zoom are tiled
+PREVIEW_ZOOM = 0.25  # cheap first pass drawn into a page slot before the sharp render
+ZOOM_SETTLE_MS = 250  # wheel zoom re-renders once no step has come in for this long
+PREFETCH_PAGES = 3  # pages rendered ahead of the viewport in the scroll direction
+PREFETCH_MAX_PAGES = 10  # upper bound when scrolling fast
+PREFETCH_MB = 64  # memory the prefetched pages may take up in the render cache
+THUMB_BOX = (110, 150)  # max thumbnail width, height in the sidebar
+THUMB_ROW_H = 185
+LAYOUT_CHUNK_PAGES = 500  # page sizes measured per idle slot after a file opens
+MERGE_CHUNK_PAGES = 500  # pages held in memory before they are appended to the output file
+EXPORT_BATCH_PAGES = 25  # pages per export task handed to a worker process
+EXPORT_FORMATS = {"png": "png", "jpeg": "jpg", "txt": "txt"}  # format -> file extension
+# Dictionaries that may be shared when identical; streams and arrays always may
+DEDUPE_TYPES = ("/Font", "/FontDescriptor", "/ExtGState", "/Encoding", "/Pattern", "/Shading")
+
+# Render queue priorities (lower runs first)
+PRIORITY_PREVIEW = 0
+PRIORITY_VISIBLE = 1
+PRIORITY_PREFETCH = 2
+PRIORITY_THUMBNAIL = 3
+
+TRACE_EVENTS = 50_000  # spans kept in the tracing ring buffer
 
 # Modern Dark Theme Palette
 COLORS = {
@@ -24,6 +94,66 @@ COLORS = {
     "list_bg": "#1e1e1e"
 }
 
+# --- Tracing ---
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer, self.name, self.args = tracer, name, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start, **self.args)
+
+class _NoSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+
+class Tracer:
+    """Durations of render pipeline stages and layout passes, recorded only while enabled.
+    Spans go to a bounded ring buffer from any thread and export in Chrome trace format
+    (chrome://tracing, Perfetto) for offline analysis."""
+    NO_SPAN = _NoSpan()
+
+    def __init__(self, capacity=TRACE_EVENTS):
+        self.enabled = False
+        self.events = deque(maxlen=capacity)  # (name, start, end, thread id, args)
+        self.origin = time.perf_counter()
+
+    def span(self, name, **args):
+        return _Span(self, name, args) if self.enabled else self.NO_SPAN
+
+    def add(self, name, start, end=None, **args):
+        if self.enabled:
+            self.events.append((name, start, time.perf_counter() if end is None else end, threading.get_ident(), args))
+
+    def recent(self, seconds=2.0):
+        """{name: [ms, ...]} for spans that ended in the last `seconds`"""
+        cutoff = time.perf_counter() - seconds
+        durations = {}
+        for name, start, end, _, _ in reversed(list(self.events)):
+            if end < cutoff: break
+            durations.setdefault(name, []).append((end - start) * 1000)
+        return durations
+
+    def export(self, path):
+        events = list(self.events)
+        pid = os.getpid()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": names.get(tid, str(tid))}}
+                 for tid in {e[3] for e in events}]
+        trace += [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6, "args": args}
+                  for name, start, end, tid, args in events]
+        with open(path, "w") as f: json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+TRACE = Tracer()
+
 # --- Global Helper: Apply Icon ---
 def apply_window_icon(window):
     """Applies the icon to any given window (Root or Toplevel)"""
@@ -45,6 +175,1570 @@ def create_btn(parent, text, cmd, bg=COLORS["toolbar"], fg=COLORS["text"], width
     b.bind("<Leave>", lambda e: b.config(bg=bg, fg=fg))
     return b
 
+# --- Global Helper: Rasterize Page ---
+def tile_clip(tile, zoom):
+    """Page-space rectangle covered by tile (column, row) at the given zoom"""
+    tx, ty = tile
+    return fitz.Rect(tx * TILE_SIZE, ty * TILE_SIZE, (tx + 1) * TILE_SIZE, (ty + 1) * TILE_SIZE) / zoom
+
+def rasterize_page(doc, i, zoom, tile=None, dlist=None):
+    """Renders page i of doc (or one tile of it) to a PageImage. Safe to call from worker threads.
+    With a fitz.DisplayList of the page the already parsed content is replayed."""
+    source = dlist if dlist is not None else doc.load_page(i)
+    mat = fitz.Matrix(zoom, zoom)
+    clip = tile_clip(tile, zoom) & source.rect if tile else None
+    with TRACE.span("render.mupdf", page=i, zoom=zoom, tile=tile):
+        pix = source.get_pixmap(matrix=mat, alpha=False, clip=clip)
+    with TRACE.span("render.ppm", page=i):
+        return PageImage.from_pixmap(pix)
+
+# --- Rendered Page Images ---
+class PageImage:
+    """A rendered page held as binary PPM, which Tk's photo image reads natively. The render
+    process joins a header and the pixmap buffer (through a memoryview) into one bytes object,
+    which is pickled back over the pool's pipe and handed to tk.PhotoImage as is; PIL is not
+    involved. The benchmark times the conversion (convert.*) and, given a display, the
+    PhotoImage step (tk.photo.*)."""
+    __slots__ = ("width", "height", "data")
+
+    def __init__(self, width, height, data):
+        self.width, self.height, self.data = width, height, data
+
+    @classmethod
+    def from_pixmap(cls, pix):
+        if pix.alpha: pix = fitz.Pixmap(pix, 0)
+        if pix.n != 3: pix = fitz.Pixmap(fitz.csRGB, pix)
+        header = b"P6\n%d %d\n255\n" % (pix.width, pix.height)
+        return cls(pix.width, pix.height, b"".join((header, pix.samples_mv)))
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    def to_pixmap(self):
+        return fitz.Pixmap(self.data)
+
+    def resized(self, width, height):
+        return PageImage.from_pixmap(fitz.Pixmap(self.to_pixmap(), width, height, None))
+
+    def photo(self):
+        return tk.PhotoImage(data=self.data, format="PPM")
+
+# --- Global Helper: Text-Only Pages ---
+def strip_page_images(doc, i, stripped):
+    """Turns the image XObjects used by page i into empty forms so rasterizing the page never
+    decodes them. Only for a private handle; stripped holds the xrefs already replaced."""
+    for item in doc.get_page_images(i):
+        xref = item[0]
+        if xref in stripped: continue
+        stripped.add(xref)
+        try:
+            doc.update_object(xref, "<</Type/XObject/Subtype/Form/BBox[0 0 1 1]>>")
+            doc.update_stream(xref, b" ")
+        except Exception as e:
+            print(f"Could not strip image {xref}: {e}")
+
+# --- Global Helper: Page Size ---
+def page_size(doc, i):
+    """Displayed (width, height) of page i read from the page dictionary, without loading the page"""
+    box = doc.page_cropbox(i)
+    rotate = doc.xref_get_key(doc.page_xref(i), "Rotate")
+    if rotate[0] == "int" and int(rotate[1]) % 180:
+        return box.height, box.width
+    return box.width, box.height
+
+# --- Page Layout Model ---
+class PageLayout:
+    """Page geometry kept as flat arrays of unscaled sizes. Positions for any zoom
+    and layout mode are derived on access, so a zoom step never walks the document."""
+    PADDING = 40
+
+    def __init__(self, doc=None):
+        self.widths = array('d')
+        self.heights = array('d')
+        self.zoom = 1.0
+        self.mode = "single"
+        if doc is not None:
+            for i in range(len(doc)):
+                w, h = page_size(doc, i)
+                self.widths.append(w)
+                self.heights.append(h)
+        self._build_offsets()
+
+    def _build_offsets(self):
+        # Cumulative unscaled row heights; a row is one page (single) or a pair (double)
+        step = 1 if self.mode == "single" else 2
+        self.offsets = array('d', [0.0])
+        self.max_w = max(self.widths, default=0.0)
+        self.max_pair = 0.0
+        for r in range(0, len(self.widths), step):
+            self.offsets.append(self.offsets[-1] + max(self.heights[r:r + step]))
+            if step == 2 and r + 1 < len(self.widths):
+                self.max_pair = max(self.max_pair, self.widths[r] + self.widths[r + 1])
+
+    @classmethod
+    def uniform(cls, count, w, h):
+        """Every page assumed to be w x h until measured, so a large file shows at once"""
+        layout = cls()
+        layout.widths = array('d', [w]) * count
+        layout.heights = array('d', [h]) * count
+        layout._build_offsets()
+        return layout
+
+    def measure(self, doc, start, stop):
+        """Replaces the assumed sizes of pages start..stop-1 with real ones; True if any differed"""
+        changed = False
+        for i in range(start, stop):
+            w, h = page_size(doc, i)
+            if w != self.widths[i] or h != self.heights[i]:
+                self.widths[i], self.heights[i] = w, h
+                changed = True
+        if changed: self._build_offsets()
+        return changed
+
+    def set_view(self, zoom, mode):
+        self.zoom = zoom
+        if mode != self.mode:
+            self.mode = mode
+            self._build_offsets()
+
+    def __len__(self):
+        return len(self.widths)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self.widths): raise IndexError(i)
+        P, z = self.PADDING, self.zoom
+        row, x = i, P
+        if self.mode == "double":
+            row = i // 2
+            if i % 2 == 1: x = P + self.widths[i - 1] * z + P
+        y = P + row * P + self.offsets[row] * z
+        return {'x': x, 'y': y, 'w': self.widths[i] * z, 'h': self.heights[i] * z}
+
+    def _row_top(self, row):
+        return self.PADDING + row * self.PADDING + self.offsets[row] * self.zoom
+
+    def row_at(self, y):
+        """Binary search for the last row starting at or above canvas y"""
+        lo, hi = 0, len(self.offsets) - 2
+        if hi < 0: return -1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._row_top(mid) <= y: lo = mid
+            else: hi = mid - 1
+        return lo
+
+    def pages_between(self, top, bot):
+        """Range of pages whose rows overlap canvas y in [top, bot)"""
+        if not self.widths: return range(0)
+        step = 1 if self.mode == "single" else 2
+        first = max(0, self.row_at(top))
+        last = self.row_at(bot)
+        return range(first * step, min(len(self.widths), (last + 1) * step))
+
+    def page_at(self, y):
+        """Page covering canvas y, or None when y falls in the padding between pages"""
+        for i in self.pages_between(y, y):
+            c = self[i]
+            if c['y'] <= y < c['y'] + c['h']: return i
+        return None
+
+    def size(self):
+        P, z = self.PADDING, self.zoom
+        width = P * 2 + self.max_w * z
+        if self.max_pair: width = max(width, P * 3 + self.max_pair * z)
+        rows = len(self.offsets) - 1
+        return width, P + rows * P + self.offsets[-1] * z
+
+    def reorder(self, order, resized=None):
+        """Keeps the pages listed in `order` (old indices) in that order; `resized` maps
+        new index -> (w, h) for pages whose geometry changed (rotation)"""
+        self.widths = array('d', (self.widths[o] for o in order))
+        self.heights = array('d', (self.heights[o] for o in order))
+        for i, (w, h) in (resized or {}).items():
+            self.widths[i], self.heights[i] = w, h
+        self._build_offsets()
+
+# --- Rendered Page Cache ---
+class PageCache:
+    """LRU cache of rendered page images bounded by a byte budget shared by all open tabs.
+    Keys are (doc key, page xref, rotation, zoom bucket, text only, tile) so entries
+    survive zoom steps, layout switches, scrolling, page moves and tab switches."""
+    def __init__(self, budget_mb=RENDER_CACHE_MB):
+        self.budget = budget_mb * 1024 * 1024
+        self.active = None  # doc key of the tab in front, evicted only once the others are gone
+        self.entries = OrderedDict()  # key -> (image, nbytes)
+        self.variants = {}  # key without zoom bucket -> zoom buckets cached for it
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def zoom_bucket(zoom):
+        return int(round(zoom * 100))
+
+    @staticmethod
+    def _base(key):
+        return key[:3] + key[4:]
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def nearest(self, key):
+        """Cached render of the same page at the closest other zoom, for previews"""
+        buckets = self.variants.get(self._base(key))
+        if not buckets: return None
+        best = min(buckets, key=lambda b: abs(b - key[3]))
+        return self.entries[key[:3] + (best,) + key[4:]][0]
+
+    def put(self, key, img):
+        nbytes = img.nbytes
+        if nbytes > self.budget: return
+        if key in self.entries: self._remove(key)
+        self.entries[key] = (img, nbytes)
+        self.variants.setdefault(self._base(key), set()).add(key[3])
+        self.used += nbytes
+        while self.used > self.budget:
+            self._remove(self._victim())
+
+    def _victim(self):
+        # Least recently used render of a background tab, else of the one in front
+        for k in self.entries:
+            if k[0] != self.active: return k
+        return next(iter(self.entries))
+
+    def _remove(self, key):
+        self.used -= self.entries.pop(key)[1]
+        base = self._base(key)
+        buckets = self.variants[base]
+        buckets.discard(key[3])
+        if not buckets: del self.variants[base]
+
+    def discard_doc(self, doc_key):
+        for k in [k for k in self.entries if k[0] == doc_key]:
+            self._remove(k)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries), "bytes": self.used, "budget": self.budget}
+
+# --- Background Render Engine ---
+# Render worker process state: a handle per source
+_render_docs = {}  # (doc key, text only) -> (version, document, stripped image xrefs)
+
+def _render_doc(key, version, path, text_only, live):
+    # Text-only jobs get their own handle whose page images are stripped as they are visited
+    cached = _render_docs.get((key, text_only))
+    if cached and cached[0] == version: return cached
+    for k in [k for k in _render_docs if k == (key, text_only) or k[0] not in live]:
+        # Outdated version, or the tab was closed: let the handle go
+        try: _render_docs.pop(k)[1].close()
+        except: pass
+    with TRACE.span("render.open", version=version):
+        doc = fitz.open(path)
+    _render_docs[(key, text_only)] = (version, doc, set())
+    return _render_docs[(key, text_only)]
+
+def _load_render(path):
+    if not path or not os.path.exists(path): return None
+    try:
+        return PageImage.from_pixmap(fitz.Pixmap(path))
+    except Exception:
+        return None
+
+def _save_render(path, img):
+    if not path: return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        img.to_pixmap().save(tmp, output="png")
+        os.replace(tmp, path)
+    except (OSError, RuntimeError) as e:
+        print(f"Could not write cache file {path}: {e}")
+
+def _render_task(key, version, path, live, page, rotation, zoom, tile, text_only, disk_path, trace):
+    """Process pool task: one page or tile as a PageImage, plus the trace spans it took.
+    rotation, if given, replaces the page's /Rotate in this worker's handle first."""
+    TRACE.enabled = trace
+    TRACE.events.clear()
+    img = _load_render(disk_path)
+    if img is None:
+        _, doc, stripped = _render_doc(key, version, path, text_only, live)
+        if rotation is not None: doc.xref_set_key(doc.page_xref(page), "Rotate", str(rotation))
+        if text_only: strip_page_images(doc, page, stripped)
+        img = rasterize_page(doc, page, zoom, tile)
+        _save_render(disk_path, img)
+    return img, list(TRACE.events)
+
+def _warm_render_worker():
+    return fitz.VersionBind
+
+class RenderJob:
+    def __init__(self, job_id, src, zoom, text_only, callback, priority, gen, disk_path=None):
+        self.job_id = job_id
+        self.key, self.i, self.tile = job_id[:3]
+        self.src = src
+        self.zoom = zoom
+        self.text_only = text_only
+        self.callbacks = [callback]
+        self.priority = priority
+        self.disk_path = disk_path  # optional persistent copy of the result (thumbnails)
+        self.gen = gen
+        self.submitted = time.perf_counter()
+        self.cancelled = False
+        self.started = False
+
+class RenderEngine:
+    """Rasterizes pages in worker processes fed from a priority queue. MuPDF holds the GIL
+    for a whole render, so render threads would still stall Tk once per page; here each
+    dispatcher thread just waits on one process at a time. Every process keeps its own
+    fitz.Document handle per source, so the Tk thread only builds the PhotoImage and places it."""
+    def __init__(self, root, workers=None):
+        self.root = root
+        self.workers = workers or max(2, min(4, os.cpu_count() or 2))
+        self.lock = threading.Lock()
+        self.queue = queue.PriorityQueue()
+        self.seq = itertools.count()
+        self.sources = {}     # doc key -> (version, path, page map, source page -> rotation)
+        self.live = frozenset()  # keys of self.sources, replaced whole for the dispatcher threads
+        self.snapshots = {}   # doc key -> temp file holding unsaved edits for the workers
+        self.pending = {}     # job id, see job_id -> RenderJob
+        self.generation = 0
+        self.pool = None      # started on first use
+        self.threads = [threading.Thread(target=self._worker_loop, name=f"render-{n}", daemon=True)
+                        for n in range(self.workers)]
+        for t in self.threads: t.start()
+
+    def _get_pool(self):
+        # Spawned, not forked: a fork would copy this process with Tk and other threads mid-call
+        with self.lock:
+            if self.pool is None:
+                self.pool = futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def warm_up(self):
+        """Starts the worker processes and their PyMuPDF import before the first page is wanted"""
+        pool = self._get_pool()
+        for _ in range(self.workers): pool.submit(_warm_render_worker)
+
+    def set_source(self, key, path=None, stream=None):
+        """Points workers at a file path or in-memory bytes (after unsaved edits)."""
+        version = self.sources[key][0] + 1 if key in self.sources else 1
+        old = self.snapshots.pop(key, None)
+        if stream is not None:
+            # Workers are separate processes: the bytes reach them as a file
+            fd, path = tempfile.mkstemp(prefix="render_", suffix=".pdf")
+            with os.fdopen(fd, "wb") as f: f.write(stream)
+            self.snapshots[key] = path
+        self.sources[key] = (version, path, None, {})
+        self.live = frozenset(self.sources)
+        self.invalidate()
+        self._remove_snapshot(old)
+
+    def reorder_source(self, key, order):
+        """Page moves and deletes only remap indices onto the source pages, so workers keep
+        their open documents."""
+        version, path, pages, rotations = self.sources[key]
+        self.sources[key] = (version, path, [pages[o] if pages else o for o in order], rotations)
+        self.invalidate()
+
+    def rotate_source(self, key, angles):
+        """Rotations are sent along with each job ({page index: angle}), so workers apply them
+        to the handles they have instead of reopening a snapshot of the whole document."""
+        version, path, pages, rotations = self.sources[key]
+        rotations = dict(rotations)  # queued jobs keep the mapping they were submitted with
+        for i, angle in angles.items(): rotations[pages[i] if pages else i] = angle
+        self.sources[key] = (version, path, pages, rotations)
+        self.invalidate()
+
+    def drop_source(self, key):
+        self.sources.pop(key, None)
+        self.live = frozenset(self.sources)
+        self.invalidate()
+        self._remove_snapshot(self.snapshots.pop(key, None))
+
+    @staticmethod
+    def _remove_snapshot(path):
+        # A worker may still have it open; on Windows it then stays until the next cleanup
+        if not path: return
+        try: os.remove(path)
+        except OSError: pass
+
+    def invalidate(self):
+        """Called on zoom/layout/edit changes: queued jobs are cancelled, running ones discarded."""
+        self.generation += 1
+        for job in self.pending.values(): job.cancelled = True
+        self.pending.clear()
+
+    @staticmethod
+    def job_id(key, i, zoom, tile=None, text_only=False, kind="page"):
+        # kind ("page", "preview", "thumb") keeps a preview from sharing a thumbnail job at the same zoom
+        return (key, i, tile, PageCache.zoom_bucket(zoom), text_only, kind)
+
+    def is_pending(self, key, i, zoom, tile=None, text_only=False, kind="page"):
+        return self.job_id(key, i, zoom, tile, text_only, kind) in self.pending
+
+    def cancel(self, key, i, zoom, tile=None, text_only=False, kind="page"):
+        job = self.pending.pop(self.job_id(key, i, zoom, tile, text_only, kind), None)
+        if job: job.cancelled = True
+
+    def promote(self, key, i, zoom, tile=None, priority=PRIORITY_VISIBLE, text_only=False, kind="page"):
+        job = self.pending.get(self.job_id(key, i, zoom, tile, text_only, kind))
+        if job and priority < job.priority:
+            # Queue it again; whichever entry a worker reaches first wins
+            job.priority = priority
+            self.queue.put((priority, next(self.seq), job))
+
+    def submit(self, key, i, zoom, text_only, callback, tile=None, priority=PRIORITY_VISIBLE, disk_path=None,
+               kind="page"):
+        if key not in self.sources: return
+        job_id = self.job_id(key, i, zoom, tile, text_only, kind)
+        job = self.pending.get(job_id)
+        if job:
+            # Same render already queued for someone else: share its result
+            job.callbacks.append(callback)
+            if disk_path and not job.disk_path: job.disk_path = disk_path
+            self.promote(key, i, zoom, tile, priority, text_only, kind)
+            return
+        job = RenderJob(job_id, self.sources[key], zoom, text_only, callback, priority, self.generation, disk_path)
+        self.pending[job_id] = job
+        self.queue.put((priority, next(self.seq), job))
+
+    def _deliver(self, job, img):
+        # Runs on the Tk thread
+        if self.pending.get(job.job_id) is job: del self.pending[job.job_id]
+        if job.cancelled or job.gen != self.generation or img is None: return
+        for callback in job.callbacks: callback(job.i, img)
+
+    def _worker_loop(self):
+        # One job in flight per thread, so the queue's priorities decide what runs next
+        while True:
+            _, _, job = self.queue.get()
+            if job is None: return
+            with self.lock:
+                if job.started or job.cancelled or job.gen != self.generation: continue
+                job.started = True
+            TRACE.add("render.queue_wait", job.submitted, page=job.i, priority=job.priority)
+            version, path, pages, rotations = job.src
+            page = pages[job.i] if pages else job.i
+            pool = self._get_pool()
+            try:
+                img, spans = pool.submit(
+                    _render_task, job.key, version, path, self.live, page, rotations.get(page),
+                    job.zoom, job.tile, job.text_only, job.disk_path, TRACE.enabled).result()
+                if TRACE.enabled: TRACE.events.extend(spans)
+            except futures.BrokenExecutor as e:
+                # A worker died (e.g. MuPDF crashed on a broken file); start a fresh pool
+                print(f"Render error page {job.i}: {e}")
+                with self.lock:
+                    if self.pool is pool: self.pool = None
+                img = None
+            except Exception as e:
+                # Stale jobs may find their snapshot already replaced
+                if job.gen == self.generation: print(f"Render error page {job.i}: {e}")
+                img = None
+            try: self.root.after(0, self._deliver, job, img)
+            except RuntimeError: return  # Tk already gone
+
+    def shutdown(self):
+        self.invalidate()
+        for _ in self.threads: self.queue.put((-1, next(self.seq), None))
+        if self.pool is not None: self.pool.shutdown(wait=False, cancel_futures=True)
+        for key in list(self.snapshots): self._remove_snapshot(self.snapshots.pop(key))
+
+# --- Reading History Store ---
+class HistoryStore:
+    """Per-document reading position in SQLite. Each save touches one row, WAL mode lets
+    several reader instances share the file, and rows beyond HISTORY_LIMIT are pruned
+    least recently opened first."""
+    def __init__(self, path=HISTORY_DB, limit=HISTORY_LIMIT):
+        self.limit = limit
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = self._connect(path)
+        except (OSError, sqlite3.Error) as e:
+            print(f"History unavailable, keeping it in memory: {e}")
+            self.conn = self._connect(":memory:")
+        self._import_legacy()
+        self.prune()
+
+    @staticmethod
+    def _connect(path):
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # scroll_y is the offset into the saved page as a fraction of its height
+        conn.execute("""CREATE TABLE IF NOT EXISTS history (
+                            path TEXT PRIMARY KEY, page INTEGER NOT NULL DEFAULT 0,
+                            zoom REAL, layout TEXT, scroll_x REAL, scroll_y REAL,
+                            last_opened REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS history_last_opened ON history (last_opened)")
+        return conn
+
+    def _import_legacy(self):
+        # Pages saved by the old JSON history; existing rows win
+        if not os.path.exists(HISTORY_FILE): return
+        try:
+            with open(HISTORY_FILE, 'r') as f: legacy = json.load(f)
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO history (path, page, last_opened) VALUES (?, ?, 0)",
+                                      [(os.path.abspath(p), int(page)) for p, page in legacy.items()])
+            os.replace(HISTORY_FILE, HISTORY_FILE + ".imported")
+        except (OSError, ValueError, AttributeError, sqlite3.Error) as e:
+            print(f"Could not import {HISTORY_FILE}: {e}")
+
+    def get(self, path):
+        row = self.conn.execute("SELECT page, zoom, layout, scroll_x, scroll_y FROM history WHERE path = ?",
+                                (os.path.abspath(path),)).fetchone()
+        if row is None: return None
+        return dict(zip(("page", "zoom", "layout", "scroll_x", "scroll_y"), row))
+
+    def put(self, path, page, zoom=None, layout=None, scroll_x=None, scroll_y=None):
+        try:
+            with self.conn:
+                self.conn.execute("""INSERT INTO history (path, page, zoom, layout, scroll_x, scroll_y, last_opened)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?)
+                                     ON CONFLICT (path) DO UPDATE SET page = excluded.page, zoom = excluded.zoom,
+                                         layout = excluded.layout, scroll_x = excluded.scroll_x,
+                                         scroll_y = excluded.scroll_y, last_opened = excluded.last_opened""",
+                                  (os.path.abspath(path), page, zoom, layout, scroll_x, scroll_y, time.time()))
+        except sqlite3.Error as e:
+            print(f"Could not save history: {e}")
+
+    def prune(self):
+        try:
+            with self.conn:
+                self.conn.execute("""DELETE FROM history WHERE path IN (
+                                         SELECT path FROM history ORDER BY last_opened DESC LIMIT -1 OFFSET ?)""",
+                                  (self.limit,))
+        except sqlite3.Error as e:
+            print(f"Could not prune history: {e}")
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+# --- Full-Text Search Index ---
+class TextIndex:
+    """Lower-cased words and their boxes for every page, keyed by page xref so page moves and
+    deletes leave it valid. Boxes are in unrotated page space, as text extraction reports them.
+    Built once per file in the background and persisted under CACHE_DIR by content hash."""
+    VERSION = 1
+
+    def __init__(self):
+        self.pages = {}  # xref -> (words joined by spaces, word start offsets, flat x0 y0 x1 y1 boxes)
+        self.complete = False
+        self.cancelled = False
+
+    @staticmethod
+    def cache_path(digest):
+        return os.path.join(CACHE_DIR, "text", f"{digest}.json.gz")
+
+    def _store(self, xref, words, boxes):
+        starts, pos = array('l'), 0
+        for w in words:
+            starts.append(pos)
+            pos += len(w) + 1
+        self.pages[xref] = (" ".join(words), starts, boxes)
+
+    def build(self, path, progress=None):
+        with fitz.open(path) as doc:
+            for i in range(len(doc)):
+                if self.cancelled: return
+                words = doc[i].get_text("words")
+                self._store(doc.page_xref(i), [w[4].lower() for w in words],
+                            [round(v, 1) for w in words for v in w[:4]])
+                if progress and (i + 1) % 50 == 0: progress(i + 1, len(doc))
+        self.complete = True
+
+    def load(self, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f: data = json.load(f)
+        if data.get("version") != self.VERSION: return False
+        for xref, (text, boxes) in data["pages"].items():
+            self._store(int(xref), text.split(" ") if text else [], boxes)
+        self.complete = True
+        return True
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        pages = {xref: [text, boxes] for xref, (text, _, boxes) in self.pages.items()}
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "pages": pages}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def search(self, query, xrefs):
+        """Case-insensitive matches of `query` as (page, [word boxes]) for the pages in `xrefs` order"""
+        needle = " ".join(query.lower().split())
+        hits = []
+        if not needle: return hits
+        for i, xref in enumerate(xrefs):
+            entry = self.pages.get(xref)
+            if entry is None: continue
+            text, starts, boxes = entry
+            pos = text.find(needle)
+            while pos != -1:
+                first = bisect_right(starts, pos) - 1
+                last = bisect_right(starts, pos + len(needle) - 1) - 1
+                hits.append((i, [tuple(boxes[4 * w:4 * w + 4]) for w in range(first, last + 1)]))
+                pos = text.find(needle, pos + 1)
+        return hits
+
+# --- Global Helper: Process Age ---
+def process_uptime():
+    """Seconds since the interpreter process started where the OS exposes it (Linux /proc), else None"""
+    try:
+        with open("/proc/self/stat") as f: start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f: uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+# --- Global Helper: File Digest ---
+def file_digest(path):
+    """Content hash used to key on-disk caches, so renamed or copied files still hit"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): h.update(chunk)
+    return h.hexdigest()
+
+def touch_cached(digest):
+    # Marks a document's disk cache entries as just used, for prune_cache
+    for path in (os.path.join(CACHE_DIR, "thumbs", digest), os.path.join(CACHE_DIR, "text", f"{digest}.json.gz")):
+        try: os.utime(path)
+        except OSError: pass
+
+def prune_cache(folder, limit_mb):
+    """Deletes entries of folder (files, or per-document folders of files) least recently
+    used first, until the rest fits in limit_mb. Returns the bytes freed."""
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    with os.scandir(e.path) as files:
+                        size = sum(f.stat().st_size for f in files if f.is_file(follow_symlinks=False))
+                else:
+                    size = e.stat().st_size
+                entries.append((e.stat().st_mtime, size, e.path))
+    except OSError:
+        return 0
+    excess = sum(size for _, size, _ in entries) - limit_mb * 1024 * 1024
+    freed = 0
+    for _, size, path in sorted(entries):
+        if freed >= excess: break
+        try:
+            if os.path.isdir(path): shutil.rmtree(path)
+            else: os.remove(path)
+            freed += size
+        except OSError as e:
+            print(f"Could not prune {path}: {e}")
+    return freed
+
+def prune_disk_caches():
+    prune_cache(os.path.join(CACHE_DIR, "thumbs"), THUMB_CACHE_MB)
+    prune_cache(os.path.join(CACHE_DIR, "text"), TEXT_CACHE_MB)
+
+# --- Headless Merge Engine ---
+def expand_inputs(items):
+    """File paths, glob patterns and @manifest files (one path per line) -> ordered list of PDFs.
+    Relative paths inside a manifest are taken from the manifest's own folder."""
+    paths = []
+    for item in items:
+        if item.startswith("@"):
+            with open(item[1:], encoding="utf-8") as f:
+                lines = [line.strip() for line in f]
+            base = os.path.dirname(item[1:])
+            def resolve(l): return "@" + os.path.join(base, l[1:]) if l.startswith("@") else os.path.join(base, l)
+            paths.extend(expand_inputs([resolve(l) for l in lines if l and not l.startswith("#")]))
+        elif any(c in item for c in "*?["):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return paths
+
+REF_PATTERN = re.compile(r"\b(\d+) 0 R\b")
+
+def dedupe_objects(doc, first, seen):
+    """Finds objects from xref first onwards that are byte-identical to one already in seen
+    (fingerprint -> xref), points every reference at that single copy and blanks the rest.
+    Runs to a fixpoint so e.g. fonts become shared once their font files are. Returns bytes saved."""
+    remap, digests, saved = {}, {}, 0
+
+    def canonical(text):
+        return REF_PATTERN.sub(lambda m: f"{remap.get(int(m[1]), int(m[1]))} 0 R", text)
+
+    candidates = range(max(first, 1), doc.xref_length())
+    changed = True
+    while changed:
+        changed = False
+        for x in candidates:
+            if x in remap: continue
+            obj = doc.xref_object(x, compressed=True)
+            is_stream = doc.xref_is_stream(x)
+            shareable = is_stream or obj.startswith("[") or any(f"/Type{t}" in obj for t in DEDUPE_TYPES)
+            if not shareable: continue
+            if is_stream and x not in digests:
+                digests[x] = hashlib.blake2b(doc.xref_stream_raw(x), digest_size=16).hexdigest()
+            fingerprint = re.sub(r"/Length \d+( 0 R)?", "", canonical(obj)) + digests.get(x, "")
+            owner = seen.setdefault(fingerprint, x)
+            if owner != x:
+                remap[x] = owner
+                saved += len(obj) + (len(doc.xref_stream_raw(x)) if is_stream else 0)
+                changed = True
+    if not remap: return 0
+
+    for x in candidates:
+        if x in remap: continue
+        if not doc.xref_is_stream(x):
+            obj = doc.xref_object(x, compressed=True)
+            new = canonical(obj)
+            if new != obj: doc.update_object(x, new)
+            continue
+        # Stream dictionaries are patched key by key so the stream data is untouched
+        for key in doc.xref_get_keys(x):
+            kind, value = doc.xref_get_key(x, key)
+            if kind in ("xref", "dict", "array") and " 0 R" in value:
+                new = canonical(value)
+                if new != value: doc.xref_set_key(x, key, new)
+    for x in remap: doc.update_object(x, "null")
+    return saved
+
+def merge_pdfs(inputs, output, progress=None, chunk_pages=MERGE_CHUNK_PAGES, dedupe=False, compact=True):
+    """Concatenates the inputs into output without holding the whole result in memory.
+    Pages are gathered in chunks of about chunk_pages and appended to the output with
+    incremental saves; the file is moved into place only once complete.
+    Each incremental save appends a new page tree and xref, so with compact the result is
+    rewritten once at the end without them (a fraction of a second for 6000 pages).
+    With dedupe, fonts, images, ICC profiles etc. repeated across inputs are stored once.
+    progress(files_done, total_files, pages_done) is called after every input."""
+    start = time.perf_counter()
+    part = output + ".part"
+    packed = output + ".packed"
+    out = fitz.open()
+    written = incremental = False
+    pages = chunk = saved = 0
+    seen, first = {}, 1
+
+    def flush(out, written):
+        nonlocal saved
+        if dedupe: saved += dedupe_objects(out, first, seen)
+        if written: out.saveIncr()
+        else: out.save(part)
+        out.close()
+        return fitz.open(part)
+
+    try:
+        for n, path in enumerate(inputs, 1):
+            with fitz.open(path) as src:
+                out.insert_pdf(src)
+                pages += len(src)
+                chunk += len(src)
+            if chunk >= chunk_pages:
+                incremental = written
+                out, written, chunk = flush(out, written), True, 0
+                first = out.xref_length()
+            if progress: progress(n, len(inputs), pages)
+        if chunk or not written:
+            incremental = written
+            out, written = flush(out, written), True
+        out.close()
+        if compact and incremental:
+            # garbage=1 drops what later saves superseded; merging duplicates is what dedupe is for
+            with fitz.open(part) as doc: doc.save(packed, garbage=1)
+            os.replace(packed, part)
+        os.replace(part, output)
+    except BaseException:
+        try: out.close()
+        except: pass
+        for p in (part, packed):
+            if os.path.exists(p): os.remove(p)
+        raise
+
+    seconds = time.perf_counter() - start
+    return {"files": len(inputs), "pages": pages, "seconds": seconds,
+            "pages_per_sec": pages / seconds if seconds else 0.0,
+            "saved_bytes": saved, "size": os.path.getsize(output)}
+
+# --- Headless Split Engine ---
+def parse_page_groups(spec, total):
+    """'1-5, 8, 10-12' -> [[0..4], [7], [9..11]] (0-based, clamped to the document).
+    Raises ValueError on malformed input."""
+    groups = []
+    for p in spec.split(','):
+        p = p.strip()
+        if not p: continue
+        if '-' in p:
+            s, e = map(int, p.split('-'))
+            if s < 1: s = 1
+            if e > total: e = total
+            pages = list(range(s-1, e))
+        else:
+            val = int(p)
+            pages = [val-1] if 1 <= val <= total else []
+        if pages: groups.append(pages)
+    return groups
+
+def page_runs(pages):
+    """Consecutive runs in an ordered page list, as (first, last) pairs for insert_pdf"""
+    runs = []
+    for p in pages:
+        if runs and p == runs[-1][1] + 1: runs[-1][1] = p
+        else: runs.append([p, p])
+    return runs
+
+def copy_pages(src, pages):
+    """New document holding only the given pages of src, copied run by run"""
+    out = fitz.open()
+    for first, last in page_runs(pages):
+        out.insert_pdf(src, from_page=first, to_page=last)
+    return out
+
+def plan_every(total, n, stem):
+    return [(f"{stem}_{k+1:04d}.pdf", list(range(s, min(s + n, total))))
+            for k, s in enumerate(range(0, total, n))]
+
+def plan_ranges(spec, total, stem):
+    return [(f"{stem}_{k+1:04d}.pdf", pages) for k, pages in enumerate(parse_page_groups(spec, total))]
+
+def plan_bookmarks(toc, total, stem, level=1):
+    """One part per bookmark at the given outline level, running to the next one"""
+    starts = [(title, page - 1) for lvl, title, page, *_ in toc if lvl == level and 1 <= page <= total]
+    if starts and starts[0][1] > 0: starts.insert(0, ("front", 0))
+    plan = []
+    for k, (title, first) in enumerate(starts):
+        last = starts[k + 1][1] if k + 1 < len(starts) else total
+        safe = re.sub(r'[^\w\- ]+', '_', title).strip()[:60] or "part"
+        if last > first: plan.append((f"{stem}_{k+1:04d}_{safe}.pdf", list(range(first, last))))
+    return plan
+
+def _write_split_parts(src, parts):
+    # Process pool task: opens its own handle on src and writes a batch of outputs
+    counts = []
+    with fitz.open(src) as doc:
+        for out_path, pages in parts:
+            with copy_pages(doc, pages) as out:
+                out.save(out_path + ".part")
+            os.replace(out_path + ".part", out_path)
+            counts.append(len(pages))
+    return counts
+
+def split_pdf(src, plan, out_dir, workers=None, progress=None, mp_context=None):
+    """Writes every (filename, pages) part of plan into out_dir using a process pool.
+    progress(parts_done, total_parts, pages_done) is called as batches finish. Callers with
+    threads of their own (the GUI) pass a spawn context so workers are not forked from them."""
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    parts = [(os.path.join(out_dir, name), pages) for name, pages in plan if pages]
+    workers = max(1, workers or os.cpu_count() or 1)
+    # Batches amortize opening the source; several per worker keep the load balanced
+    size = max(1, min(50, len(parts) // (workers * 4)))
+    batches = [parts[k:k + size] for k in range(0, len(parts), size)]
+
+    files = pages = 0
+    def collect(counts):
+        nonlocal files, pages
+        files += len(counts)
+        pages += sum(counts)
+        if progress: progress(files, len(parts), pages)
+
+    if workers == 1 or len(batches) <= 1:
+        for batch in batches: collect(_write_split_parts(src, batch))
+    else:
+        with futures.ProcessPoolExecutor(max_workers=min(workers, len(batches)), mp_context=mp_context) as pool:
+            for f in futures.as_completed([pool.submit(_write_split_parts, src, b) for b in batches]):
+                collect(f.result())
+
+    seconds = time.perf_counter() - start
+    return {"files": files, "pages": pages, "seconds": seconds,
+            "pages_per_sec": pages / seconds if seconds else 0.0}
+
+# --- Batch Export ---
+_export_source = None  # (path, document) opened once per worker process
+
+def _open_export_source(src):
+    global _export_source
+    if _export_source is None or _export_source[0] != src:
+        if _export_source: _export_source[1].close()
+        _export_source = (src, fitz.open(src))
+    return _export_source[1]
+
+def _export_batch(src, jobs, fmt, dpi, quality, doc=None):
+    # Process pool task: one page in memory at a time, each output written beside its
+    # final name and renamed, so a file that exists is always complete. Callers outside
+    # the pool pass their own doc; the module-wide handle is only for worker processes
+    if doc is None: doc = _open_export_source(src)
+    for i, out_path in jobs:
+        page = doc[i]
+        if fmt == "txt":
+            with open(out_path + ".part", "w", encoding="utf-8") as f: f.write(page.get_text())
+        else:
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            pix.save(out_path + ".part", output=fmt, jpg_quality=quality)
+        os.replace(out_path + ".part", out_path)
+    return len(jobs)
+
+def export_pages(src, out_dir, fmt="png", dpi=150, pages=None, workers=None, progress=None,
+                 quality=90, stop=None, mp_context=None):
+    """Writes each page of src (or just `pages`) to out_dir as an image or text file, spread
+    over a process pool. Pages whose file already exists are skipped, so an interrupted run
+    picks up where it left off. progress(done, total) is called as batches finish; setting
+    the `stop` event lets running batches finish and submits no more. The GUI passes a spawn
+    mp_context, as for split_pdf."""
+    start = time.perf_counter()
+    with fitz.open(src) as doc: total = len(doc)
+    pages = list(range(total)) if pages is None else pages
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(src))[0]
+    width = max(4, len(str(total)))
+    jobs = [(i, os.path.join(out_dir, f"{stem}_{i+1:0{width}d}.{EXPORT_FORMATS[fmt]}")) for i in pages]
+    todo = [job for job in jobs if not os.path.exists(job[1])]
+    skipped = len(jobs) - len(todo)
+    workers = max(1, workers or os.cpu_count() or 1)
+    batches = [todo[k:k + EXPORT_BATCH_PAGES] for k in range(0, len(todo), EXPORT_BATCH_PAGES)]
+
+    written = 0
+    def collect(count):
+        nonlocal written
+        written += count
+        if progress: progress(skipped + written, len(jobs))
+
+    if progress: progress(skipped, len(jobs))
+    if workers == 1 or len(batches) <= 1:
+        workers = 1
+        with fitz.open(src) as doc:
+            for batch in batches:
+                if stop and stop.is_set(): break
+                collect(_export_batch(src, batch, fmt, dpi, quality, doc))
+    else:
+        workers = min(workers, len(batches))
+        # A couple of batches queued per worker keeps them busy without queuing the whole document
+        with futures.ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            queued, running = iter(batches), set()
+            while True:
+                while len(running) < workers * 2 and not (stop and stop.is_set()):
+                    batch = next(queued, None)
+                    if batch is None: break
+                    running.add(pool.submit(_export_batch, src, batch, fmt, dpi, quality))
+                if not running: break
+                finished, running = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for f in finished: collect(f.result())
+
+    seconds = time.perf_counter() - start
+    rate = written / seconds if seconds else 0.0
+    return {"pages": written, "skipped": skipped, "total": len(jobs), "seconds": seconds, "workers": workers,
+            "pages_per_sec": rate, "pages_per_sec_per_core": rate / workers}
+
+# --- Watch-Folder Service ---
+def run_watch_job(job_path, inbox, out_dir, every=1):
+    """Process pool task: runs one claimed job, a JSON manifest or a dropped PDF (split every
+    `every` pages). Relative paths in manifests are taken from the inbox. Outputs appear in
+    out_dir only once complete, so a job cut short by a restart can simply run again."""
+    started = time.time()
+    job_id = os.path.splitext(os.path.basename(job_path))[0]
+    dropped = job_path.lower().endswith(".pdf")
+    if dropped:
+        job = {"split": job_path, "every": every}
+    else:
+        with open(job_path, encoding="utf-8") as f: job = json.load(f)
+    def resolve(p): return "@" + os.path.join(inbox, p[1:]) if p.startswith("@") else os.path.join(inbox, p)
+    # Outputs never leave out_dir, whatever the manifest says
+    name = os.path.basename(job.get("output") or "") or job_id
+
+    if "merge" in job:
+        inputs = expand_inputs([resolve(p) for p in job["merge"]])
+        if not inputs: raise ValueError("no input files")
+        target = os.path.join(out_dir, name if name.lower().endswith(".pdf") else name + ".pdf")
+        stats = merge_pdfs(inputs, target, dedupe=bool(job.get("dedupe")))
+        kind, outputs, size = "merge", [target], stats["size"]
+    elif "split" in job:
+        src = job_path if dropped else resolve(job["split"])
+        with fitz.open(src) as doc: total, toc = len(doc), doc.get_toc()
+        stem = os.path.splitext(os.path.basename(src))[0]
+        if "ranges" in job: plan = plan_ranges(job["ranges"], total, stem)
+        elif "bookmarks" in job: plan = plan_bookmarks(toc, total, stem, int(job["bookmarks"]))
+        else: plan = plan_every(total, max(1, int(job.get("every", every))), stem)
+        if not plan: raise ValueError("nothing to split")
+        # Parts go to a scratch folder that is renamed into place when all are written
+        target = os.path.join(out_dir, name)
+        part = target + ".part"
+        shutil.rmtree(part, ignore_errors=True)
+        stats = split_pdf(src, plan, part, workers=1)
+        if os.path.exists(target): shutil.rmtree(target)
+        os.replace(part, target)
+        kind, outputs = "split", [os.path.join(target, f) for f, _ in plan]
+        size = sum(os.path.getsize(p) for p in outputs)
+    else:
+        raise ValueError("manifest needs a 'merge' or 'split' key")
+    return {"kind": kind, "pages": stats["pages"], "outputs": outputs, "bytes": size,
+            "started": started, "finished": time.time()}
+
+class WatchService:
+    """Unattended merge/split jobs over a folder tree, for headless boxes:
+    root/inbox   drop *.json manifests or *.pdf files here; subfolders are left alone, so
+                 manifest inputs can be staged in them
+    root/work    claimed jobs, queued or running, in one locked folder per instance; the jobs
+                 of an instance that died are picked up by the next one to start
+    root/out     outputs, each moved into place only once complete
+    root/done, root/failed  job files once they have run
+    root/jobs.jsonl  one record per job with its wait, run time, latency and pages/s
+    At most workers + queue_limit jobs are claimed at a time; the rest stay in the inbox.
+    Several instances can share a tree: each claims into its own folder, so none runs
+    another's jobs. A job that takes its worker process down fails on its own and the pool
+    is started again."""
+    def __init__(self, root, workers=None, queue_limit=None, every=1, settle=2.0, log=print):
+        root = os.path.abspath(root)  # workers resolve manifest paths against the inbox
+        self.dirs = {d: os.path.join(root, d) for d in ("inbox", "work", "out", "done", "failed")}
+        self.journal = os.path.join(root, "jobs.jsonl")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.queue_limit = self.workers * 2 if queue_limit is None else max(0, queue_limit)
+        self.every = every
+        self.settle = settle  # s a dropped file must stay untouched, so half-copied files wait
+        self.log = log
+        self.work = None  # this instance's folder in work/, see take_work_dir
+        self.lock_file = None
+        self.stopping = False
+        self.latencies = []  # ms from drop to output, for the summary
+        self.counts = {"done": 0, "failed": 0, "pages": 0}
+
+    def scan(self):
+        """Job files in the inbox, oldest first, and how many are still being written"""
+        ready, settling = [], 0
+        now = time.time()
+        with os.scandir(self.dirs["inbox"]) as entries:
+            for e in entries:
+                if e.name.startswith(".") or not e.is_file() or not e.name.lower().endswith((".json", ".pdf")): continue
+                mtime = e.stat().st_mtime
+                if now - mtime < self.settle: settling += 1
+                else: ready.append((mtime, e.name))
+        return [name for _, name in sorted(ready)], settling
+
+    def take_work_dir(self):
+        """Creates this instance's folder in work/, locked for as long as the process lives,
+        and moves in the jobs of instances that are gone (their lock is free). Returns those."""
+        for d in self.dirs.values(): os.makedirs(d, exist_ok=True)
+        # Locked under a dot name, which adoption skips, then renamed into place: another
+        # instance starting now must never see the folder before its lock is held
+        hidden = tempfile.mkdtemp(prefix=f".{platform.node()}-{os.getpid()}-", dir=self.dirs["work"])
+        self.lock_file = open(os.path.join(hidden, ".lock"), "w")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.work = os.path.join(self.dirs["work"], os.path.basename(hidden)[1:])
+        os.rename(hidden, self.work)
+        orphans = []
+        for name in sorted(os.listdir(self.dirs["work"])):
+            folder = os.path.join(self.dirs["work"], name)
+            if folder == self.work or name.startswith("."): continue
+            try:
+                if not os.path.isdir(folder):  # claimed before work/ had instance folders
+                    orphans.append(self.adopt(folder))
+                    continue
+                with open(os.path.join(folder, ".lock"), "a") as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)  # BlockingIOError while its owner runs
+                    for job in sorted(os.listdir(folder)):
+                        if not job.startswith("."): orphans.append(self.adopt(os.path.join(folder, job)))
+                    os.remove(lock.name)
+                os.rmdir(folder)
+            except OSError:
+                continue  # still owned, or another instance adopted it first
+        return orphans
+
+    def adopt(self, job_path):
+        dest = os.path.join(self.work, os.path.basename(job_path))
+        os.replace(job_path, dest)
+        return dest
+
+    def release_work_dir(self):
+        if self.lock_file is None: return
+        self.lock_file.close()
+        self.lock_file = None
+        try:
+            os.remove(os.path.join(self.work, ".lock"))
+            os.rmdir(self.work)
+        except OSError:
+            pass  # queued jobs remain; the next instance to start adopts them
+
+    def claim(self, name):
+        # The rename is the lock: another instance on the same tree gets FileNotFoundError
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        dest = os.path.join(self.work, f"{stamp}-{name}")
+        for n in itertools.count(2):
+            if not os.path.exists(dest): break
+            dest = os.path.join(self.work, f"{stamp}-{n}-{name}")
+        try:
+            os.replace(os.path.join(self.dirs["inbox"], name), dest)
+        except OSError:
+            return None
+        return dest
+
+    def claim_ready(self, ready, in_flight):
+        """Back-pressure: claims only what the pool and the queue can take"""
+        room = max(0, self.workers + self.queue_limit - in_flight)
+        return [path for path in map(self.claim, ready[:room]) if path]
+
+    def finish(self, job_path, claimed, future):
+        dropped = os.path.getmtime(job_path)  # renames keep it
+        record = {"job": os.path.basename(job_path), "claimed": claimed}
+        try:
+            stats = future.result()
+            record.update(stats, status="done", wait_s=stats["started"] - claimed,
+                          run_s=stats["finished"] - stats["started"])
+            record["pages_per_sec"] = stats["pages"] / record["run_s"] if record["run_s"] else 0.0
+            self.counts["pages"] += stats["pages"]
+        except Exception as e:
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+        finished = record.get("finished", time.time())
+        record["latency_s"] = finished - dropped
+        self.counts[record["status"]] += 1
+        self.latencies.append(record["latency_s"] * 1000)
+        os.replace(job_path, os.path.join(self.dirs[record["status"]], os.path.basename(job_path)))
+        with open(self.journal, "a", encoding="utf-8") as f: f.write(json.dumps(record) + "\n")
+        if record["status"] == "done":
+            self.log(f"done   {record['job']}: {record['kind']} {record['pages']} pages in {record['run_s']:.2f}s "
+                     f"({record['pages_per_sec']:.1f} pages/s), waited {record['wait_s']:.2f}s, "
+                     f"latency {record['latency_s']:.2f}s")
+        else:
+            self.log(f"failed {record['job']}: {record['error']}")
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def new_pool(self):
+        # Ctrl+C is for this process only: workers carry on with their job so it finishes cleanly
+        return futures.ProcessPoolExecutor(max_workers=self.workers, initializer=signal.signal,
+                                           initargs=(signal.SIGINT, signal.SIG_IGN))
+
+    def reap(self, done, running, queued, suspects):
+        """Finishes the done futures. Returns True if the pool broke because a worker process
+        died (e.g. MuPDF crashing on a malformed file): every job it was running fails with it,
+        so only a job that ran alone is blamed; the others are queued again as suspects."""
+        broken = False
+        for f in done:
+            if isinstance(f.exception(), futures.BrokenExecutor): broken = True
+            else: self.finish(*running.pop(f), f)
+        if not broken: return False
+        futures.wait(running)  # the rest of the pool's jobs end right away
+        crashed = [f for f in running if isinstance(f.exception(), futures.BrokenExecutor)]
+        for f in list(running):
+            path, claimed = running.pop(f)
+            if f in crashed and len(crashed) > 1 and path not in suspects:
+                suspects.add(path)
+                queued.appendleft((path, claimed))
+            else:
+                suspects.discard(path)
+                self.finish(path, claimed, f)
+        return True
+
+    def restart_pool(self, pool):
+        self.log("a worker process died; starting a new pool")
+        pool.shutdown(wait=False)
+        return self.new_pool()
+
+    def run(self, interval=1.0, once=False):
+        """Polls the inbox until stopped (SIGTERM / Ctrl+C), or with once until it is empty.
+        Jobs already running finish first; queued ones stay in work/ for the next start."""
+        queued = deque((path, time.time()) for path in self.take_work_dir())
+        if queued: self.log(f"resuming {len(queued)} jobs left in {self.dirs['work']}")
+        running = {}  # future -> (job path, claim time)
+        suspects = set()  # were running when a worker died; each runs again on its own
+        signal.signal(signal.SIGTERM, self.stop)
+        start = time.time()
+        pool = self.new_pool()
+        try:
+            while not self.stopping:
+                ready, settling = self.scan()
+                for path in self.claim_ready(ready, len(queued) + len(running)):
+                    queued.append((path, time.time()))
+                while queued and len(running) < self.workers:
+                    if running and (queued[0][0] in suspects or any(p in suspects for p, _ in running.values())):
+                        break
+                    path, claimed = queued.popleft()
+                    try:
+                        running[pool.submit(run_watch_job, path, self.dirs["inbox"], self.dirs["out"],
+                                            self.every)] = (path, claimed)
+                    except futures.BrokenExecutor:
+                        queued.appendleft((path, claimed))
+                        self.reap(futures.wait(running)[0], running, queued, suspects)
+                        pool = self.restart_pool(pool)
+                        break
+                if once and not (running or queued or ready or settling): break
+                if not running:
+                    time.sleep(interval)
+                    continue
+                finished, _ = futures.wait(running, timeout=interval, return_when=futures.FIRST_COMPLETED)
+                if self.reap(finished, running, queued, suspects): pool = self.restart_pool(pool)
+        except KeyboardInterrupt:
+            self.stopping = True
+        finally:
+            # Suspects put back here simply stay in work/ for the next start
+            self.reap(futures.wait(running)[0], running, queued, suspects)
+            pool.shutdown()
+            self.release_work_dir()
+        return self.summary(time.time() - start)
+
+    def summary(self, seconds):
+        jobs = self.counts["done"] + self.counts["failed"]
+        result = {"jobs": jobs, "failed": self.counts["failed"], "pages": self.counts["pages"], "seconds": seconds,
+                  "jobs_per_min": jobs * 60 / seconds if seconds else 0.0,
+                  "pages_per_sec": self.counts["pages"] / seconds if seconds else 0.0}
+        if self.latencies: result["latency"] = summarize(self.latencies)
+        return result
+
+# --- Headless Benchmarks ---
+BENCH_KINDS = ("text", "image", "vector")
+BENCH_ZOOMS = (0.5, 1.0, 2.0)
+LOREM = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+         "labore et dolore magna aliqua ut enim ad minim veniam quis nostrud exercitation ullamco").split()
+
+def make_synthetic_pdf(kind, path, pages, seed=0):
+    """Writes a reproducible test document: dense text, photo-like images, many vector
+    strokes, or ("plain") one short line per page for very long files"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    images = []
+    if kind == "image":
+        for _ in range(4):
+            img = Image.merge("RGB", [Image.effect_noise((1200, 1600), 40 + 20 * c) for c in range(3)])
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=85)
+            images.append(buf.getvalue())
+    for n in range(pages):
+        page = doc.new_page(width=612, height=792)
+        if kind == "text":
+            words = " ".join(rng.choice(LOREM) for _ in range(900))
+            page.insert_textbox(fitz.Rect(36, 36, 576, 756), words, fontsize=8)
+        elif kind == "image":
+            page.insert_image(fitz.Rect(36, 36, 576, 756), stream=images[n % len(images)])
+        elif kind == "vector":
+            shape = page.new_shape()
+            for _ in range(4000):
+                x, y = rng.uniform(36, 576), rng.uniform(36, 756)
+                shape.draw_line((x, y), (x + rng.uniform(-40, 40), y + rng.uniform(-40, 40)))
+            shape.finish(color=(0.1, 0.2, 0.6), width=0.4)
+            shape.commit()
+        page.insert_text((36, 780), f"{kind} page {n + 1}", fontsize=9)
+    doc.save(path, deflate=True)
+    doc.close()
+    return path
+
+def reset_peak_rss():
+    # Linux resets VmHWM on request; elsewhere peaks are cumulative over the run
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+    except OSError:
+        pass
+
+def proc_status_mb(field):
+    # Linux only; None elsewhere
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def rss_mb():
+    """Current resident memory, or the peak where the current value is not available"""
+    current = proc_status_mb("VmRSS")
+    return current if current is not None else peak_rss_mb()
+
+def peak_rss_mb():
+    peak = proc_status_mb("VmHWM")
+    if peak is not None: return peak
+    try: peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError: return None
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def summarize(samples_ms, **extra):
+    ordered = sorted(samples_ms)
+    result = {"count": len(ordered), "median_ms": ordered[len(ordered) // 2],
+              "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+              "min_ms": ordered[0], "max_ms": ordered[-1]}
+    result.update(extra)
+    return result
+
+def run_benchmarks(work_dir, quick=False, progress=None):
+    """Times the hot paths behind the viewer and the merge/split tools on generated files.
+    Returns {name: stats}; every entry carries peak_rss_mb for its own run where the OS allows."""
+    sizes = {"text": 20, "image": 12, "vector": 12, "plain": 2000 if quick else 10000}
+    render_pages = 3 if quick else 8
+    files = {}
+    for kind, pages in sizes.items():
+        if progress: progress(f"generating {kind} ({pages} pages)")
+        files[kind] = make_synthetic_pdf(kind, os.path.join(work_dir, f"{kind}.pdf"), pages)
+
+    results = {}
+    def record(name, samples, **extra):
+        results[name] = summarize(samples, peak_rss_mb=peak_rss_mb(), **extra)
+        if progress: progress(f"{name}: median {results[name]['median_ms']:.2f} ms")
+
+    def timed(fn):
+        t = time.perf_counter()
+        fn()
+        return (time.perf_counter() - t) * 1000
+
+    # Rendering: cold parses the page each time, replay reuses a display list. Parsing is a
+    # small share of a render even for vector pages, so the render workers do not keep them
+    for kind in BENCH_KINDS:
+        with fitz.open(files[kind]) as doc:
+            for zoom in BENCH_ZOOMS:
+                reset_peak_rss()
+                record(f"render.{kind}.cold@{zoom}",
+                       [timed(lambda i=i: rasterize_page(doc, i, zoom)) for i in range(render_pages)])
+                dlists = [doc.load_page(i).get_displaylist() for i in range(render_pages)]
+                reset_peak_rss()
+                record(f"render.{kind}.replay@{zoom}",
+                       [timed(lambda i=i: rasterize_page(doc, i, zoom, dlist=dlists[i])) for i in range(render_pages)])
+                dlists.clear()
+
+    # Pixmap -> Tk handoff: the PIL route rendering used to take against the PPM route, on a
+    # 2x render and a 4K-wide one; the Tk half needs a display and is skipped without one
+    try:
+        tk_root = tk.Tk()
+        tk_root.withdraw()
+    except tk.TclError:
+        tk_root = None
+        if progress: progress("no display: skipping Tk photo image timings")
+    with fitz.open(files["image"]) as doc:
+        page = doc.load_page(0)
+        for label, zoom in (("2x", 2.0), ("4k", 3840 / page.rect.width)):
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            size = [pix.width, pix.height]
+            reset_peak_rss()
+            record(f"convert.pil.{label}", [timed(lambda pix=pix: Image.frombytes("RGB", size, pix.samples)) for _ in range(5)],
+                   pixels=pix.width * pix.height)
+            reset_peak_rss()
+            samples = [timed(lambda pix=pix: PageImage.from_pixmap(pix)) for _ in range(5)]
+            record(f"convert.ppm.{label}", samples, pixels=pix.width * pix.height,
+                   saved_ms=results[f"convert.pil.{label}"]["median_ms"] - summarize(samples)["median_ms"])
+            if tk_root is not None:
+                pil, ppm = Image.frombytes("RGB", size, pix.samples), PageImage.from_pixmap(pix)
+                record(f"tk.photo.pil.{label}", [timed(lambda pil=pil: ImageTk.PhotoImage(pil)) for _ in range(5)])
+                record(f"tk.photo.ppm.{label}", [timed(ppm.photo) for _ in range(5)])
+                del pil, ppm
+            del pix
+    if tk_root is not None: tk_root.destroy()
+
+    # Layout over the long document
+    with fitz.open(files["plain"]) as doc:
+        n = len(doc)
+        reset_peak_rss()
+        record("layout.build", [timed(lambda: PageLayout(doc)) for _ in range(3)], pages=n)
+        layout = PageLayout.uniform(n, *page_size(doc, 0))
+        record("layout.measure_chunk", [timed(lambda s=s: layout.measure(doc, s, min(n, s + LAYOUT_CHUNK_PAGES)))
+                                        for s in range(0, n, LAYOUT_CHUNK_PAGES)], pages=LAYOUT_CHUNK_PAGES)
+        record("layout.switch_mode", [timed(lambda m=m: layout.set_view(1.0, m)) for m in ("double", "single") * 3])
+        layout.set_view(1.0, "single")
+        height = layout.size()[1]
+        rng = random.Random(1)
+        ys = [rng.random() * height for _ in range(10000)]
+        record("layout.page_at_x10000", [timed(lambda: [layout.page_at(y) for y in ys])])
+
+    # Scroll simulation: wheel steps through the text document, rendering newly visible pages
+    with fitz.open(files["text"]) as doc:
+        layout = PageLayout(doc)
+        layout.set_view(1.0, "single")
+        cache = PageCache()
+        view_h, frames = 900, []
+        reset_peak_rss()
+        for top in range(0, int(layout.size()[1] - view_h), 120):
+            def frame():
+                for i in layout.pages_between(top - 800, top + view_h + 800):
+                    key = (0, i, 0, PageCache.zoom_bucket(1.0), False, None)
+                    if cache.get(key) is not None: continue
+                    cache.put(key, rasterize_page(doc, i, 1.0))
+            frames.append(timed(frame))
+        record("scroll.text@1.0", frames, hit_rate=cache.stats()["hit_rate"])
+
+    # Merge and split
+    inputs = [files[k] for k in ("text", "image", "vector", "plain")]
+    for dedupe in (False, True):
+        reset_peak_rss()
+        out = os.path.join(work_dir, f"merged_{int(dedupe)}.pdf")
+        stats = merge_pdfs(inputs, out, dedupe=dedupe)
+        record("merge.dedupe" if dedupe else "merge", [stats["seconds"] * 1000],
+               pages_per_sec=stats["pages_per_sec"], size=stats["size"])
+    with fitz.open(files["plain"]) as doc:
+        total = len(doc)
+        reset_peak_rss()
+        record("split.extract", [timed(lambda: copy_pages(doc, range(0, total, 2)).close())], pages=total // 2)
+    plan = plan_every(total, 500, "plain")
+    for workers in (1, None):
+        out_dir = os.path.join(work_dir, f"split_{workers or 'all'}")
+        reset_peak_rss()
+        stats = split_pdf(files["plain"], plan, out_dir, workers)
+        record(f"split.every500.{'serial' if workers == 1 else 'pool'}", [stats["seconds"] * 1000],
+               pages_per_sec=stats["pages_per_sec"])
+    return results
+
+def compare_benchmarks(base, current):
+    """Rows of (name, base median ms, current median ms, change %) for entries in both runs"""
+    rows = []
+    for name, entry in current.items():
+        if name not in base: continue
+        before, after = base[name]["median_ms"], entry["median_ms"]
+        rows.append((name, before, after, (after - before) / before * 100 if before else 0.0))
+    return rows
+
+# --- Sidebar: Page Thumbnails ---
+class ThumbnailSidebar(tk.Frame):
+    """Page list with thumbnails, driven like the Listbox it replaces. Rows are virtual:
+    only those in view have canvas items, and their thumbnails are requested as they appear."""
+    def __init__(self, parent, request_thumbnail):
+        super().__init__(parent, bg=COLORS["sidebar"])
+        self.request_thumbnail = request_thumbnail
+        self.count = 0
+        self.selected = set()
+        self.anchor = None  # row shift-click ranges extend from
+        self.rows = {}    # row -> (background, image, label) canvas items
+        self.images = {}  # row -> PhotoImage
+        self.refresh_job = None
+
+        self.scroll = ttk.Scrollbar(self, orient=tk.VERTICAL, style="Vertical.TScrollbar")
+        self.canvas = tk.Canvas(self, bg=COLORS["sidebar"], highlightthickness=0, bd=0,
+                                yscrollcommand=self._on_yview)
+        self.scroll.config(command=self.canvas.yview)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', lambda e: self.redraw())
+        self.canvas.bind('<ButtonPress-1>', self._on_click)
+        self.canvas.bind('<Control-Button-1>', lambda e: self._on_click(e, "toggle"))
+        self.canvas.bind('<Shift-Button-1>', lambda e: self._on_click(e, "range"))
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', self._on_wheel)
+        self.canvas.bind('<Button-5>', self._on_wheel)
+
+    def set_count(self, n):
+        self.count = n
+        self.selected = {i for i in self.selected if i < n}
+        self.canvas.config(scrollregion=(0, 0, 1, n * THUMB_ROW_H))
+        self.redraw()
+
+    def redraw(self):
+        self.canvas.delete("all")
+        self.rows.clear()
+        self.images.clear()
+        self.schedule_refresh()
+
+    def reorder(self, order, changed=()):
+        """Follows a page move/delete: rows now showing a different page are rebuilt, the rest kept"""
+        new_index = {o: n for n, o in enumerate(order)}
+        self.selected = {new_index[o] for o in self.selected if o in new_index}
+        self.anchor = new_index.get(self.anchor)
+        self.count = len(order)
+        self.canvas.config(scrollregion=(0, 0, 1, self.count * THUMB_ROW_H))
+        for i in [i for i in self.rows if i >= self.count or order[i] != i or i in changed]:
+            for item in self.rows.pop(i): self.canvas.delete(item)
+            self.images.pop(i, None)
+        for i in self.rows: self._paint_row(i)
+        self.schedule_refresh()
+
+    def set_thumbnail(self, i, img):
+        if i not in self.rows: return
+        tk_img = img.photo()
+        self.images[i] = tk_img
+        self.canvas.itemconfigure(self.rows[i][1], image=tk_img)
+
+    # Listbox-compatible selection API
+    def curselection(self):
+        return tuple(sorted(self.selected))
+
+    def selection_clear(self, first=0, last=None):
+        prev, self.selected = self.selected, set()
+        for i in prev: self._paint_row(i)
+
+    def selection_set(self, i):
+        if not 0 <= i < self.count: return
+        self.selected.add(i)
+        self.anchor = i
+        self._paint_row(i)
+
+    def see(self, i):
+        top, view_h = self.canvas.canvasy(0), self.canvas.winfo_height()
+        y = i * THUMB_ROW_H
+        if y < top or y + THUMB_ROW_H > top + view_h:
+            self.canvas.yview_moveto(max(0, y - (view_h - THUMB_ROW_H) / 2) / max(1, self.count * THUMB_ROW_H))
+
+    def _paint_row(self, i):
+        if i in self.rows:
+            fill = COLORS["accent"] if i in self.selected else COLORS["sidebar"]
+            self.canvas.itemconfigure(self.rows[i][0], fill=fill)
+
+    def _on_click(self, event, mode=None):
+        # Plain click selects one row, Ctrl toggles a row, Shift extends from the anchor
+        i = int(self.canvas.canvasy(event.y) // THUMB_ROW_H)
+        if not 0 <= i < self.count: return
+        if mode == "toggle" and i in self.selected:
+            self.selected.discard(i)
+            self._paint_row(i)
+        elif mode == "range" and self.anchor is not None:
+            lo, hi = sorted((self.anchor, i))
+            self.selection_clear()
+            self.selected.update(range(lo, hi + 1))
+            for r in range(lo, hi + 1): self._paint_row(r)
+        else:
+            if mode is None: self.selection_clear()
+            self.selection_set(i)
+        self.event_generate('<<ListboxSelect>>')
+
+    def _on_wheel(self, event):
+        delta = int(-1*(event.delta/120)) if event.delta else 0
+        if event.num == 4: delta = -1
+        elif event.num == 5: delta = 1
+        self.canvas.yview_scroll(delta, "units")
+
+    def _on_yview(self, *args):
+        self.scroll.set(*args)
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if self.refresh_job is None:
+            self.refresh_job = self.after(16, self.refresh)
+
+    def destroy(self):
+        # Closed tabs take their sidebar with them; a queued refresh would find a dead canvas
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        super().destroy()
+
+    def refresh(self):
+        self.refresh_job = None
+        top = self.canvas.canvasy(0)
+        bot = top + self.canvas.winfo_height()
+        visible = range(max(0, int(top // THUMB_ROW_H)), min(self.count, int(bot // THUMB_ROW_H) + 1))
+        for i in [i for i in self.rows if i not in visible]:
+            for item in self.rows.pop(i): self.canvas.delete(item)
+            self.images.pop(i, None)
+        mid = self.canvas.winfo_width() / 2
+        for i in visible:
+            if i in self.rows:
+                # A view change may have cancelled its render: ask again
+                if i not in self.images: self.request_thumbnail(i)
+                continue
+            y = i * THUMB_ROW_H
+            bg = self.canvas.create_rectangle(0, y, mid * 2, y + THUMB_ROW_H, fill=COLORS["sidebar"], outline="")
+            img = self.canvas.create_image(mid, y + 8, anchor=tk.N)
+            label = self.canvas.create_text(mid, y + THUMB_ROW_H - 14, text=f"Page {i+1}",
+                                            fill=COLORS["text"], font=("Segoe UI", 9))
+            self.rows[i] = (bg, img, label)
+            self._paint_row(i)
+            self.request_thumbnail(i)
+
 # --- Tool Window: Merge PDF ---
 class MergeWindow(tk.Toplevel):
     def __init__(self, parent):
@@ -56,6 +1750,7 @@ class MergeWindow(tk.Toplevel):
         apply_window_icon(self) # Apply Icon
         
         self.pdf_list = [] 
+        self.dedupe = tk.BooleanVar(value=True)
 
         # Layout
         main_frame = tk.Frame(self, bg=COLORS["bg"], padx=10, pady=10)
@@ -79,6 +1774,9 @@ class MergeWindow(tk.Toplevel):
         create_btn(btn_frame, "▲ Move Up", self.move_up, width=12).pack(pady=2)
         create_btn(btn_frame, "▼ Move Down", self.move_down, width=12).pack(pady=2)
         tk.Frame(btn_frame, bg=COLORS["bg"], height=20).pack() 
+        tk.Checkbutton(btn_frame, text="Share identical\nfonts/images", variable=self.dedupe, justify=tk.LEFT,
+                       bg=COLORS["bg"], fg=COLORS["text"], selectcolor=COLORS["bg"],
+                       activebackground=COLORS["bg"], activeforeground="white", bd=0).pack(anchor="w")
         
         btn_merge = tk.Button(btn_frame, text="MERGE NOW", command=self.do_merge, 
                               bg=COLORS["accent"], fg="white", font=("Segoe UI", 10, "bold"), 
@@ -133,28 +1831,42 @@ class MergeWindow(tk.Toplevel):
         if not save_path: return
 
         try:
-            out_doc = fitz.open()
-            for pdf in self.pdf_list:
-                with fitz.open(pdf) as src:
-                    out_doc.insert_pdf(src)
-            out_doc.save(save_path)
-            messagebox.showinfo("Success", "PDFs Merged Successfully!")
+            stats = merge_pdfs(self.pdf_list, save_path, dedupe=self.dedupe.get())
+            msg = "PDFs Merged Successfully!"
+            if stats["saved_bytes"]: msg += f"\nShared resources saved {stats['saved_bytes'] / 1024 / 1024:.1f} MB."
+            messagebox.showinfo("Success", msg)
             self.destroy()
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
 # --- Tool Window: Split PDF ---
+def snapshot_source(doc, path):
+    """A file worker processes can open for doc: its own path, or a temporary copy when
+    there are unsaved edits. The copy is returned second so the caller can remove it."""
+    if path and not doc.is_dirty: return path, None
+    fd, snapshot = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        doc.save(snapshot)
+    except BaseException:
+        os.remove(snapshot)
+        raise
+    return snapshot, snapshot
+
 class SplitWindow(tk.Toplevel):
     def __init__(self, parent, current_doc, current_path):
         super().__init__(parent)
         self.title("Split PDF")
-        self.geometry("500x300")
+        self.geometry("500x400")
         self.configure(bg=COLORS["bg"])
         self.transient(parent)
         apply_window_icon(self) # Apply Icon
         
         self.doc = current_doc
+        self.path = current_path
         self.total_pages = len(current_doc)
+        self.mode = tk.StringVar(value="extract")
+        self.snapshot = None
         
         filename = os.path.basename(current_path) if current_path else "Untitled"
         tk.Label(self, text=f"Split File: {filename}", bg=COLORS["bg"], fg="white", 
@@ -162,48 +1874,56 @@ class SplitWindow(tk.Toplevel):
         
         tk.Label(self, text=f"Total Pages: {self.total_pages}", bg=COLORS["bg"], fg="#aaaaaa").pack()
 
-        input_frame = tk.Frame(self, bg=COLORS["bg"], pady=20)
+        mode_frame = tk.Frame(self, bg=COLORS["bg"], pady=10)
+        mode_frame.pack()
+        for text, value in (("Extract range", "extract"), ("Every N pages", "every"),
+                            ("File per range", "ranges"), ("By bookmarks", "bookmarks")):
+            tk.Radiobutton(mode_frame, text=text, value=value, variable=self.mode, command=self.on_mode_change,
+                           bg=COLORS["bg"], fg=COLORS["text"], selectcolor=COLORS["bg"],
+                           activebackground=COLORS["bg"], activeforeground="white", bd=0).pack(side=tk.LEFT, padx=4)
+
+        input_frame = tk.Frame(self, bg=COLORS["bg"], pady=10)
         input_frame.pack()
         
-        tk.Label(input_frame, text="Page Range:", bg=COLORS["bg"], fg=COLORS["text"]).pack(anchor="w")
+        self.lbl_input = tk.Label(input_frame, text="Page Range:", bg=COLORS["bg"], fg=COLORS["text"])
+        self.lbl_input.pack(anchor="w")
         self.ent_range = tk.Entry(input_frame, width=40, bg=COLORS["entry_bg"], fg="white", 
                                   insertbackground="white", bd=0, font=("Segoe UI", 11))
         self.ent_range.pack(pady=5, ipady=5)
         
-        tk.Label(input_frame, text="Example: 1-5, 8, 10-12", bg=COLORS["bg"], fg="#777777", font=("Segoe UI", 9)).pack(anchor="w")
-
-        btn_split = tk.Button(self, text="Extract & Save", command=self.do_split,
-                              bg=COLORS["accent"], fg="white", font=("Segoe UI", 10, "bold"),
-                              bd=0, relief=tk.FLAT, padx=20, pady=8)
-        btn_split.pack(pady=10)
-        btn_split.bind("<Enter>", lambda e: btn_split.config(bg=COLORS["accent_hover"]))
-        btn_split.bind("<Leave>", lambda e: btn_split.config(bg=COLORS["accent"]))
+        self.lbl_hint = tk.Label(input_frame, text="Example: 1-5, 8, 10-12", bg=COLORS["bg"], fg="#777777", font=("Segoe UI", 9))
+        self.lbl_hint.pack(anchor="w")
+
+        self.btn_split = tk.Button(self, text="Extract & Save", command=self.do_split,
+                                   bg=COLORS["accent"], fg="white", font=("Segoe UI", 10, "bold"),
+                                   bd=0, relief=tk.FLAT, padx=20, pady=8)
+        self.btn_split.pack(pady=10)
+        self.btn_split.bind("<Enter>", lambda e: self.btn_split.config(bg=COLORS["accent_hover"]))
+        self.btn_split.bind("<Leave>", lambda e: self.btn_split.config(bg=COLORS["accent"]))
+
+    def on_mode_change(self):
+        label, hint = {"extract": ("Page Range:", "Example: 1-5, 8, 10-12"),
+                       "every": ("Pages per file:", "Example: 10"),
+                       "ranges": ("Page Ranges (one file each):", "Example: 1-5, 8, 10-12"),
+                       "bookmarks": ("Bookmark level:", "1 = top-level chapters")}[self.mode.get()]
+        self.lbl_input.config(text=label)
+        self.lbl_hint.config(text=hint)
 
     def do_split(self):
+        if self.mode.get() != "extract":
+            self.do_bulk_split()
+            return
         range_str = self.ent_range.get()
         if not range_str: return
 
         try:
-            pages_to_keep = []
-            for p in range_str.split(','):
-                p = p.strip()
-                if '-' in p:
-                    s, e = map(int, p.split('-'))
-                    if s < 1: s = 1
-                    if e > self.total_pages: e = self.total_pages
-                    pages_to_keep.extend(range(s-1, e))
-                else:
-                    val = int(p)
-                    if 1 <= val <= self.total_pages:
-                        pages_to_keep.append(val-1)
+            pages_to_keep = [p for group in parse_page_groups(range_str, self.total_pages) for p in group]
             
             if not pages_to_keep:
                 messagebox.showwarning("Error", "No valid pages selected.")
                 return
 
-            new_doc = fitz.open()
-            new_doc.insert_pdf(self.doc, from_page=-1, to_page=-1, start_at=-1)
-            new_doc.select(pages_to_keep)
+            new_doc = copy_pages(self.doc, pages_to_keep)
             
             save_path = filedialog.asksaveasfilename(defaultextension=".pdf", title="Save Split PDF")
             if save_path:
@@ -216,11 +1936,210 @@ class SplitWindow(tk.Toplevel):
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def do_bulk_split(self):
+        value = self.ent_range.get().strip()
+        stem = os.path.splitext(os.path.basename(self.path))[0] if self.path else "split"
+        try:
+            mode = self.mode.get()
+            if mode == "every":
+                plan = plan_every(self.total_pages, max(1, int(value)), stem)
+            elif mode == "ranges":
+                plan = plan_ranges(value, self.total_pages, stem)
+            else:
+                plan = plan_bookmarks(self.doc.get_toc(), self.total_pages, stem, int(value or 1))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid input for this split mode.")
+            return
+        if not plan:
+            messagebox.showwarning("Error", "Nothing to split (no valid pages or bookmarks).")
+            return
+
+        out_dir = filedialog.askdirectory(title="Folder for Split Files")
+        if not out_dir: return
+
+        # Workers open the source themselves; give them a snapshot if there are unsaved edits
+        try:
+            src, self.snapshot = snapshot_source(self.doc, self.path)
+        except Exception as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        self.btn_split.config(state=tk.DISABLED)
+        # The pool is driven from a thread so the viewer stays responsive, as for exports
+        threading.Thread(target=self._run_bulk, args=(src, plan, out_dir), daemon=True).start()
+
+    def _run_bulk(self, src, plan, out_dir):
+        # Results go through the main window: callbacks queued on this one die with it
+        def progress(done, total, pages):
+            try: self.master.after(0, self._show_progress, done, total)
+            except RuntimeError: pass
+        try:
+            # The viewer's render threads are running: fork would copy them mid-call
+            stats = split_pdf(src, plan, out_dir, progress=progress, mp_context=multiprocessing.get_context("spawn"))
+            result = (None, stats)
+        except Exception as e:
+            result = (e, None)
+        try: self.master.after(0, self._bulk_done, *result)
+        except RuntimeError: pass
+
+    def _show_progress(self, done, total):
+        if self.winfo_exists(): self.title(f"Split PDF - {done}/{total} files")
+
+    def _bulk_done(self, error, stats):
+        if self.snapshot and os.path.exists(self.snapshot): os.remove(self.snapshot)
+        self.snapshot = None
+        if not self.winfo_exists(): return
+        if error is not None:
+            messagebox.showerror("Error", str(error), parent=self)
+            self.btn_split.config(state=tk.NORMAL)
+            return
+        messagebox.showinfo("Success", f"Wrote {stats['files']} files in {stats['seconds']:.1f}s.", parent=self)
+        self.destroy()
+
+class ExportWindow(tk.Toplevel):
+    def __init__(self, parent, current_doc, current_path):
+        super().__init__(parent)
+        self.title("Export Pages")
+        self.geometry("500x380")
+        self.configure(bg=COLORS["bg"])
+        self.transient(parent)
+        apply_window_icon(self) # Apply Icon
+
+        self.doc = current_doc
+        self.path = current_path
+        self.total_pages = len(current_doc)
+        self.format = tk.StringVar(value="png")
+        self.stop = threading.Event()
+        self.snapshot = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        filename = os.path.basename(current_path) if current_path else "Untitled"
+        tk.Label(self, text=f"Export File: {filename}", bg=COLORS["bg"], fg="white",
+                 font=("Segoe UI", 12, "bold")).pack(pady=(20, 5))
+        tk.Label(self, text=f"Total Pages: {self.total_pages}", bg=COLORS["bg"], fg="#aaaaaa").pack()
+
+        mode_frame = tk.Frame(self, bg=COLORS["bg"], pady=10)
+        mode_frame.pack()
+        for text, value in (("PNG", "png"), ("JPEG", "jpeg"), ("Text", "txt")):
+            tk.Radiobutton(mode_frame, text=text, value=value, variable=self.format,
+                           bg=COLORS["bg"], fg=COLORS["text"], selectcolor=COLORS["bg"],
+                           activebackground=COLORS["bg"], activeforeground="white", bd=0).pack(side=tk.LEFT, padx=4)
+
+        input_frame = tk.Frame(self, bg=COLORS["bg"], pady=5)
+        input_frame.pack()
+        tk.Label(input_frame, text="Page Range (empty = all):", bg=COLORS["bg"], fg=COLORS["text"]).pack(anchor="w")
+        self.ent_range = tk.Entry(input_frame, width=40, bg=COLORS["entry_bg"], fg="white",
+                                  insertbackground="white", bd=0, font=("Segoe UI", 11))
+        self.ent_range.pack(pady=5, ipady=5)
+        tk.Label(input_frame, text="DPI:", bg=COLORS["bg"], fg=COLORS["text"]).pack(anchor="w")
+        self.ent_dpi = tk.Entry(input_frame, width=8, bg=COLORS["entry_bg"], fg="white",
+                                insertbackground="white", bd=0, font=("Segoe UI", 11))
+        self.ent_dpi.insert(0, "150")
+        self.ent_dpi.pack(anchor="w", pady=5, ipady=5)
+
+        self.btn_export = tk.Button(self, text="Export…", command=self.do_export,
+                                    bg=COLORS["accent"], fg="white", font=("Segoe UI", 10, "bold"),
+                                    bd=0, relief=tk.FLAT, padx=20, pady=8)
+        self.btn_export.pack(pady=10)
+        self.btn_export.bind("<Enter>", lambda e: self.btn_export.config(bg=COLORS["accent_hover"]))
+        self.btn_export.bind("<Leave>", lambda e: self.btn_export.config(bg=COLORS["accent"]))
+        self.lbl_status = tk.Label(self, text="", bg=COLORS["bg"], fg="#aaaaaa")
+        self.lbl_status.pack()
+
+    def do_export(self):
+        value = self.ent_range.get().strip()
+        try:
+            dpi = int(self.ent_dpi.get())
+            pages = None
+            if value: pages = list(dict.fromkeys(p for g in parse_page_groups(value, self.total_pages) for p in g))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid page range or DPI.", parent=self)
+            return
+        if pages == [] or dpi <= 0:
+            messagebox.showwarning("Error", "No valid pages selected.", parent=self)
+            return
+        out_dir = filedialog.askdirectory(title="Folder for Exported Pages", parent=self)
+        if not out_dir: return
+
+        # Workers open the source themselves; give them a snapshot if there are unsaved edits
+        try:
+            src, self.snapshot = snapshot_source(self.doc, self.path)
+        except Exception as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        self.btn_export.config(state=tk.DISABLED)
+        # The pool is driven from a thread so the viewer stays responsive; closing the window stops it
+        threading.Thread(target=self._run, args=(src, out_dir, self.format.get(), dpi, pages), daemon=True).start()
+
+    def _run(self, src, out_dir, fmt, dpi, pages):
+        # Results go through the main window: callbacks queued on this one die with it
+        def progress(done, total):
+            if self.stop.is_set(): return
+            try: self.master.after(0, self._show_progress, done, total)
+            except RuntimeError: pass
+        try:
+            stats = export_pages(src, out_dir, fmt, dpi, pages, progress=progress, stop=self.stop,
+                                 mp_context=multiprocessing.get_context("spawn"))
+            result = (None, stats)
+        except Exception as e:
+            result = (e, None)
+        try: self.master.after(0, self._done, *result)
+        except RuntimeError: pass
+
+    def _show_progress(self, done, total):
+        # May still be queued when the window closes
+        if self.winfo_exists(): self.lbl_status.config(text=f"{done}/{total} pages")
+
+    def _done(self, error, stats):
+        self.drop_snapshot()
+        if self.stop.is_set() or not self.winfo_exists(): return
+        if error is not None:
+            messagebox.showerror("Error", str(error), parent=self)
+            self.btn_export.config(state=tk.NORMAL)
+            return
+        messagebox.showinfo("Success", f"Exported {stats['pages']} pages in {stats['seconds']:.1f}s "
+                                       f"({stats['pages_per_sec_per_core']:.1f} pages/s per core).\n"
+                                       f"{stats['skipped']} pages were already there.", parent=self)
+        self.destroy()
+
+    def drop_snapshot(self):
+        if self.snapshot and os.path.exists(self.snapshot): os.remove(self.snapshot)
+        self.snapshot = None
+
+    def on_close(self):
+        # Batches already running finish; exporting to the same folder again resumes
+        self.stop.set()
+        self.destroy()
+
 
 # --- Main Application ---
+class DocumentTab:
+    """An open document in the tab strip. PDFReader works on the front document through its
+    own attributes; while a tab is in the background they are parked in `state`."""
+    FIELDS = ("doc", "current_file_path", "doc_key", "doc_hash", "page_coords", "zoom_level", "layout_mode",
+              "current_page_index", "text_index", "search_query", "search_hits", "hit_pages", "search_pos",
+              "page_listbox")
+
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        self.state = {}
+        self.position = None  # view position as saved to history, restored when shown again
+
+    @property
+    def title(self):
+        name = os.path.basename(self.path)
+        return name if len(name) <= 28 else name[:27] + "…"
+
 class PDFReader:
-    def __init__(self, root):
+    def __init__(self, root, timing=False, trace_path=None):
         self.root = root
+        self.timing = timing  # print the startup report
+        self.trace_path = trace_path  # trace recorded for the whole session, written on close
+        TRACE.enabled = trace_path is not None
+        self.timings = {}     # startup / file open marks, ms
+        self.open_started = None
+        self.after_first_paint = []  # deferred work of open_pdf, run once the first page shows
+        self.first_paint_job = None
         self.root.title("Python PDF Reader Pro")
         self.root.geometry("1400x900")
         self.root.configure(bg=COLORS["bg"])
@@ -235,19 +2154,53 @@ class PDFReader:
         self.current_page_index = 0
         self.sidebar_visible = True
         self.resize_timer = None
+        self.window_size = None
+        self.visibility_job = None
+        self.zoom_settle_job = None  # set while a wheel zoom is in progress
+        self.zoom_gesture = None  # (scale, dx, dy, x, y): canvas = layout * scale + d, last mouse point
+        self.scroll_y = 0
+        self.scroll_time = time.perf_counter()
+        self.scroll_dir = 1
+        self.scroll_velocity = 0.0  # canvas px per second, signed
+        self.prefetching = set()
         
         self.layout_mode = "single"  
         self.text_only_mode = tk.BooleanVar(value=False)
         self.hand_mode = False       
         
-        self.page_images = {} 
-        self.page_coords = []
+        self.page_images = {}  # page -> PhotoImage, or {tile: PhotoImage} for tiled pages
+        self.page_coords = PageLayout()
+        self.placeholders = {}  # page -> (shadow, rect, label) canvas items near the viewport
+        self.spare_placeholders = []
+        self.tile_jobs = {}
+        self.preview_images = {}
+        self.paint_started = {}  # page -> [request time, first pixel shown]
+        self.paint_times = {"first_pixel": deque(maxlen=500), "sharp": deque(maxlen=500)}
+        self.renderer = RenderEngine(self.root)
+        self.page_cache = PageCache()
+        self.doc_key = 0
+        self.doc_keys = itertools.count(1)
+        self.tabs = []  # DocumentTab, in strip order
+        self.active_tab = None
+        self.doc_hash = None
+        self.text_index = None
+        self.search_query = ""
+        self.search_hits = []  # (page, [word boxes]) in document order
+        self.hit_pages = {}    # page -> indices into search_hits
+        self.search_pos = -1
+        self.highlighted = set()  # visible pages whose highlight rectangles are drawn
         
         self._setup_ui()
         
         # --- Keyboard Shortcuts ---
         self.root.bind('<Control-o>', lambda e: self.open_pdf())
         self.root.bind('<Control-s>', lambda e: self.save_pdf())
+        self.root.bind('<Control-f>', lambda e: self.focus_search())
+        self.root.bind('<Control-w>', lambda e: self.close_tab())
+        self.root.bind('<Control-Tab>', lambda e: self.cycle_tab(1))
+        self.root.bind('<Control-Shift-Tab>', lambda e: self.cycle_tab(-1))
+        if self.root._windowingsystem == "x11":
+            self.root.bind('<Control-ISO_Left_Tab>', lambda e: self.cycle_tab(-1))
         self.root.bind('<Control-equal>', lambda e: self.zoom_in()) # Ctrl +
         self.root.bind('<Control-minus>', lambda e: self.zoom_out()) # Ctrl -
         
@@ -260,11 +2213,13 @@ class PDFReader:
         self.root.bind('<Shift-Button-4>', self.on_horizontal_scroll)   
         self.root.bind('<Shift-Button-5>', self.on_horizontal_scroll)   
         self.root.bind('<Control-MouseWheel>', self.on_zoom_scroll) 
+        self.root.bind('<Control-Button-4>', self.on_zoom_scroll)
+        self.root.bind('<Control-Button-5>', self.on_zoom_scroll)
         self.canvas.bind('<ButtonPress-1>', self.on_mouse_down)
         self.canvas.bind('<B1-Motion>', self.on_mouse_drag)
+        self.root.bind('<Map>', self.on_window_shown, add="+")
         
-        self.history = self.load_history()
-        self.check_visibility_loop()
+        self.history = HistoryStore()
 
     def _setup_ui(self):
         style = ttk.Style()
@@ -280,16 +2235,20 @@ class PDFReader:
 
         create_btn(toolbar, "📂 Open (Ctrl+O)", self.open_pdf).pack(side=tk.LEFT, padx=1)
         create_btn(toolbar, "💾 Save (Ctrl+S)", self.save_pdf).pack(side=tk.LEFT, padx=1)
+        create_btn(toolbar, "🗜 Optimize", self.optimize_pdf).pack(side=tk.LEFT, padx=1)
         
         tk.Frame(toolbar, width=1, bg="gray", height=20).pack(side=tk.LEFT, padx=10, fill=tk.Y, pady=5)
 
         create_btn(toolbar, "Merge", self.open_merge_window).pack(side=tk.LEFT, padx=1)
         create_btn(toolbar, "Split", self.open_split_window).pack(side=tk.LEFT, padx=1)
+        create_btn(toolbar, "Export", self.open_export_window).pack(side=tk.LEFT, padx=1)
         
         tk.Frame(toolbar, width=1, bg="gray", height=20).pack(side=tk.LEFT, padx=10, fill=tk.Y, pady=5)
 
         self.btn_hand = create_btn(toolbar, "✋", self.toggle_hand_mode, width=3)
         self.btn_hand.pack(side=tk.LEFT, padx=1)
+        self.btn_perf = create_btn(toolbar, "📊", self.toggle_perf_overlay, width=3)
+        self.btn_perf.pack(side=tk.LEFT, padx=1)
 
         self.btn_layout = tk.Menubutton(toolbar, text="Layout", bg=COLORS["toolbar"], fg=COLORS["text"], 
                                         bd=0, relief=tk.FLAT, font=("Segoe UI", 10), padx=10, pady=5)
@@ -326,18 +2285,33 @@ class PDFReader:
         self.lbl_total_pages = tk.Label(fr_nav, text="/ 0", bg=COLORS["toolbar"], fg=COLORS["text"])
         self.lbl_total_pages.pack(side=tk.LEFT)
 
+        fr_search = tk.Frame(toolbar, bg=COLORS["toolbar"])
+        fr_search.pack(side=tk.RIGHT, padx=10)
+
+        tk.Label(fr_search, text="🔍", bg=COLORS["toolbar"], fg=COLORS["text"]).pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.ent_search = tk.Entry(fr_search, textvariable=self.search_var, width=18,
+                                   bg=COLORS["bg"], fg="white", insertbackground="white", bd=0)
+        self.ent_search.pack(side=tk.LEFT, padx=5, ipady=3)
+        self.ent_search.bind('<Return>', lambda e: self.search_step(1))
+        self.ent_search.bind('<Shift-Return>', lambda e: self.search_step(-1))
+        self.ent_search.bind('<Escape>', lambda e: self.clear_search())
+        create_btn(fr_search, "▲", lambda: self.search_step(-1), width=2).pack(side=tk.LEFT)
+        create_btn(fr_search, "▼", lambda: self.search_step(1), width=2).pack(side=tk.LEFT)
+        self.lbl_search = tk.Label(fr_search, text="", width=14, bg=COLORS["toolbar"], fg=COLORS["text"])
+        self.lbl_search.pack(side=tk.LEFT)
+
+        # One button per open document, packed above the panes once the first one opens
+        self.tab_bar = tk.Frame(self.root, bg=COLORS["bg"])
+
         self.main_pane = tk.PanedWindow(self.root, orient=tk.HORIZONTAL, sashwidth=2, bg=COLORS["bg"], bd=0)
         self.main_pane.pack(fill=tk.BOTH, expand=True)
 
         self.sidebar_frame = tk.Frame(self.main_pane, bg=COLORS["sidebar"], width=200)
         self.main_pane.add(self.sidebar_frame, minsize=150)
         
-        self.page_listbox = tk.Listbox(self.sidebar_frame, selectmode=tk.SINGLE, 
-                                       bg=COLORS["sidebar"], fg=COLORS["text"], bd=0, 
-                                       highlightthickness=0, activestyle="none",
-                                       selectbackground=COLORS["accent"], selectforeground="white")
+        self.page_listbox = self.empty_sidebar = self.new_sidebar(None)
         self.page_listbox.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-        self.page_listbox.bind('<<ListboxSelect>>', self.on_sidebar_click)
         
         tools_frame = tk.Frame(self.sidebar_frame, bg=COLORS["sidebar"])
         tools_frame.pack(side=tk.BOTTOM, fill=tk.X)
@@ -364,7 +2338,7 @@ class PDFReader:
         self.h_scroll = ttk.Scrollbar(self.frame_container, orient=tk.HORIZONTAL, style="Horizontal.TScrollbar")
         
         self.canvas = tk.Canvas(self.frame_container, bg=COLORS["canvas"], highlightthickness=0,
-                                yscrollcommand=self.v_scroll.set, xscrollcommand=self.h_scroll.set)
+                                yscrollcommand=self.on_canvas_yview, xscrollcommand=self.on_canvas_xview)
         
         self.v_scroll.config(command=self.canvas.yview)
         self.h_scroll.config(command=self.canvas.xview)
@@ -372,6 +2346,17 @@ class PDFReader:
         self.h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Performance overlay, floated over the top right of the page view while enabled
+        self.perf_frame = tk.Frame(self.frame_container, bg="black")
+        # Fixed size, in characters and rows: a label that grows with its text would send <Configure>
+        # events every refresh
+        self.lbl_perf = tk.Label(self.perf_frame, justify=tk.LEFT, anchor=tk.NW, bg="black", fg="#7CFC00",
+                                 font=("Consolas", 9), width=48, height=13)
+        self.lbl_perf.pack(side=tk.TOP, fill=tk.X, padx=6, pady=(4, 0))
+        create_btn(self.perf_frame, "Export trace…", self.export_trace, bg="black",
+                   font=("Segoe UI", 9)).pack(side=tk.TOP, anchor=tk.E, padx=4, pady=4)
+        self.perf_job = None
+
     def open_merge_window(self):
         MergeWindow(self.root)
 
@@ -381,6 +2366,12 @@ class PDFReader:
             return
         SplitWindow(self.root, self.doc, self.current_file_path)
 
+    def open_export_window(self):
+        if not self.doc:
+            messagebox.showwarning("Export", "Open a PDF first.")
+            return
+        ExportWindow(self.root, self.doc, self.current_file_path)
+
     def toggle_sidebar(self):
         if self.sidebar_visible:
             self.main_pane.forget(self.sidebar_frame)
@@ -389,57 +2380,333 @@ class PDFReader:
             self.main_pane.add(self.sidebar_frame, before=self.frame_container, width=200)
             self.sidebar_visible = True
 
-    def load_history(self):
-        if os.path.exists(HISTORY_FILE):
-            try: return json.load(open(HISTORY_FILE, 'r'))
-            except: return {}
-        return {}
+    def new_sidebar(self, doc_key):
+        # Every tab keeps its own page list; hidden ones must not ask for thumbnails
+        def request_thumbnail(i):
+            if doc_key == self.doc_key: self.request_thumbnail(i)
+        sidebar = ThumbnailSidebar(self.sidebar_frame, request_thumbnail)
+        sidebar.bind('<<ListboxSelect>>', self.on_sidebar_click)
+        return sidebar
+
+    def view_position(self):
+        # Vertical scroll is kept relative to the current page, so it survives layout estimates
+        c = self.page_coords[self.current_page_index]
+        return {"page": self.current_page_index, "zoom": self.zoom_level, "layout": self.layout_mode,
+                "scroll_x": self.canvas.xview()[0], "scroll_y": (self.canvas.canvasy(0) - c['y']) / max(1, c['h'])}
 
     def save_history(self):
         if self.current_file_path and self.doc:
-            self.history[self.current_file_path] = getattr(self, 'current_page_index', 0)
-            with open(HISTORY_FILE, 'w') as f: json.dump(self.history, f)
+            self.history.put(self.current_file_path, **self.view_position())
+
+    def restore_position(self, entry):
+        # Zoom and layout first, then the page and the offset into it
+        if entry is None:
+            self.refresh_view()
+            self.go_to_page(0)
+            return
+        if entry["zoom"]: self.zoom_level = max(self.min_zoom, min(self.max_zoom, entry["zoom"]))
+        if entry["layout"] in ("single", "double"): self.layout_mode = entry["layout"]
+        self.refresh_view()
+        self.go_to_page(entry["page"])
+        if entry["scroll_y"] is not None:
+            c = self.page_coords[entry["page"]]
+            self.canvas.xview_moveto(entry["scroll_x"] or 0)
+            self.canvas.yview_moveto((c['y'] + entry["scroll_y"] * c['h']) / self.page_coords.size()[1])
 
     def open_pdf(self):
         path = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")])
         if not path: return
-        
-        if self.doc:
-            self.save_history()
-            try: self.doc.close()
-            except: pass
-        
-        self.doc = None
-        self.page_images.clear()
-        self.page_coords = []
-        self.canvas.delete("all")
-        
-        self.current_file_path = path
+        tab = self.tab_for_path(path)
+        if tab is not None:
+            self.switch_tab(tab)
+            return
+
+        open_started = time.perf_counter()
         try: 
-            self.doc = fitz.open(path)
+            doc = fitz.open(path)
         except Exception as e:
             messagebox.showerror("Error", str(e))
             return
 
+        # The document in front stays open in its tab, with its layout, index and cached renders
+        self.park_tab()
+        self.page_images.clear()
+        self.canvas.delete("all")
+        self.text_index = None
+        self.clear_search()
+
+        self.doc = doc
+        self.doc_hash = None
+        self.current_file_path = path
+        self.current_page_index = 0
+        self.open_started = open_started
+        self.timings = {k: v for k, v in self.timings.items() if k.startswith("startup")}
+        self.doc_key = next(self.doc_keys)
+        self.active_tab = DocumentTab(self.doc_key, path)
+        self.tabs.append(self.active_tab)
+        self.page_listbox = self.new_sidebar(self.doc_key)
+        self.page_listbox.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.page_cache.active = self.doc_key
+        self.renderer.set_source(self.doc_key, path=path)
+        # Only the saved page is measured up front; the rest of the layout follows in chunks
+        self.after_first_paint.clear()
+        entry = self.history.get(path)
+        if entry is not None and not 0 <= entry["page"] < len(self.doc): entry = None
+        self.page_coords = PageLayout.uniform(len(self.doc), *page_size(self.doc, entry["page"] if entry else 0))
+        self.defer_until_painted(lambda key=self.doc_key: self.measure_layout(key))
+        self.defer_until_painted(lambda key=self.doc_key: self.rehash_document(path, key))
+
         self.root.title(f"PDF Editor - {os.path.basename(path)}")
         self.lbl_total_pages.config(text=f"/ {len(self.doc)}")
         self.zoom_level = 1.0 
         self.update_sidebar()
+        self.restore_position(entry)
+        self.redraw_tab_bar()
+        self.mark_timing("open_to_layout_shown", self.open_started)
+
+    # --- Tabs ---
+    def tab_for_path(self, path):
+        path = os.path.normcase(os.path.abspath(path))
+        return next((t for t in self.tabs if os.path.normcase(os.path.abspath(t.path)) == path), None)
+
+    def tab_for_key(self, doc_key):
+        return next((t for t in self.tabs if t.key == doc_key), None)
+
+    def park_tab(self):
+        # Moves the front document's state into its tab and remembers where the view was
+        self.page_listbox.pack_forget()
+        tab = self.active_tab
+        if tab is None: return
+        self.save_history()
+        tab.position = self.view_position()
+        tab.state = {name: getattr(self, name) for name in DocumentTab.FIELDS}
+        self.active_tab = None
+
+    def switch_tab(self, tab):
+        if tab is self.active_tab: return
+        self.park_tab()
+        self.show_tab(tab)
+
+    def show_tab(self, tab):
+        # Layout, text index and cached renders are all still there, so only the visible pages get placed
+        with TRACE.span("tab.switch", pages=len(tab.state["doc"])):
+            for name, value in tab.state.items(): setattr(self, name, value)
+            tab.state = {}
+            self.active_tab = tab
+            self.page_cache.active = self.doc_key
+            self.page_listbox.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+            self.root.title(f"PDF Editor - {os.path.basename(tab.path)}")
+            self.lbl_total_pages.config(text=f"/ {len(self.doc)}")
+            self.search_var.set(self.search_query)
+            self.restore_position(tab.position)
+            if self.search_query:
+                # The index may have grown in the background; keep the hit the user was on
+                pos = self.search_pos
+                self.run_search(self.search_query)
+                self.search_pos = min(pos, len(self.search_hits) - 1)
+                if self.search_pos >= 0: self.redraw_highlights(self.search_hits[self.search_pos][0])
+            self.update_search_label()
+            # Hashed while in the background: indexing starts now
+            if self.doc_hash and self.text_index is None: self.start_indexing(self.doc_hash)
+        self.redraw_tab_bar()
+
+    def cycle_tab(self, step):
+        if len(self.tabs) < 2 or self.active_tab is None: return "break"
+        self.switch_tab(self.tabs[(self.tabs.index(self.active_tab) + step) % len(self.tabs)])
+        return "break"
+
+    def close_tab(self, tab=None):
+        tab = tab or self.active_tab
+        if tab is None: return
+        was_active = tab is self.active_tab
+        if was_active: self.park_tab()
+        pos = self.tabs.index(tab)
+        self.tabs.remove(tab)
+        state, tab.state = tab.state, {}
+        self.renderer.drop_source(tab.key)
+        self.page_cache.discard_doc(tab.key)
+        if state["text_index"]: state["text_index"].cancelled = True
+        state["page_listbox"].destroy()
+        try: state["doc"].close()
+        except: pass
+        if not was_active: self.redraw_tab_bar()
+        elif self.tabs: self.show_tab(self.tabs[min(pos, len(self.tabs) - 1)])
+        else: self.show_no_document()
+
+    def show_no_document(self):
+        self.doc = None
+        self.doc_key = 0
+        self.current_file_path = None
+        self.doc_hash = None
+        self.text_index = None
+        self.page_coords = PageLayout()
+        self.current_page_index = 0
+        self.page_cache.active = None
+        # The closed tab's sidebar is gone: swap in the empty one before anything refreshes it
+        self.page_listbox = self.empty_sidebar
+        self.page_listbox.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.clear_search()
         self.refresh_view()
-        
-        saved_page = self.history.get(path, 0)
-        if saved_page >= len(self.doc): saved_page = 0
-        self.go_to_page(saved_page)
+        self.canvas.config(scrollregion=(0, 0, 0, 0))
+        self.root.title("Python PDF Reader Pro")
+        self.lbl_total_pages.config(text="/ 0")
+        self.page_entry_var.set("0")
+        self.redraw_tab_bar()
+
+    def redraw_tab_bar(self):
+        for child in self.tab_bar.winfo_children(): child.destroy()
+        if not self.tabs:
+            self.tab_bar.pack_forget()
+            return
+        for tab in self.tabs:
+            bg = COLORS["accent"] if tab is self.active_tab else COLORS["toolbar"]
+            frame = tk.Frame(self.tab_bar, bg=bg)
+            frame.pack(side=tk.LEFT, padx=(0, 1))
+            create_btn(frame, tab.title, lambda t=tab: self.switch_tab(t), bg=bg,
+                       font=("Segoe UI", 9)).pack(side=tk.LEFT)
+            create_btn(frame, "×", lambda t=tab: self.close_tab(t), bg=bg, width=1,
+                       font=("Segoe UI", 9)).pack(side=tk.LEFT)
+        if not self.tab_bar.winfo_ismapped():
+            self.tab_bar.pack(side=tk.TOP, fill=tk.X, before=self.main_pane)
+
+    # --- Startup ---
+    def mark_timing(self, name, since):
+        self.timings[name] = (time.perf_counter() - since) * 1000
+
+    def on_window_shown(self, event):
+        if event.widget is not self.root or "startup_window_shown" in self.timings: return
+        self.mark_timing("startup_window_shown", STARTUP_T0)
+        age = process_uptime()
+        if age is not None:
+            # Interpreter start up to the first line of this module
+            self.timings["startup_interpreter"] = age * 1000 - self.timings["startup_window_shown"]
+        if self.timing: self.print_timings("startup")
+        # Warm PyMuPDF and the render processes up while the user is still picking a file
+        threading.Thread(target=lambda: fitz.Document, daemon=True).start()
+        self.renderer.warm_up()
+        threading.Thread(target=prune_disk_caches, daemon=True).start()
+
+    def defer_until_painted(self, task):
+        # Work that would compete with the first page for CPU and disk (hashing, layout) waits for it
+        self.after_first_paint.append(task)
+        if self.first_paint_job is None:
+            self.first_paint_job = self.root.after(1000, self.run_after_first_paint)
+
+    def run_after_first_paint(self):
+        if self.first_paint_job is not None: self.root.after_cancel(self.first_paint_job)
+        self.first_paint_job = None
+        tasks, self.after_first_paint = self.after_first_paint, []
+        for task in tasks: task()
+
+    def measure_layout(self, doc_key, start=0):
+        # Real page sizes replace the estimates a chunk at a time, keeping the page in view anchored
+        tab = self.tab_for_key(doc_key)
+        if tab is None: return
+        if tab is not self.active_tab:
+            # Background tabs are measured all the same, with nothing on screen to move
+            layout = tab.state["page_coords"]
+            stop = min(len(layout), start + LAYOUT_CHUNK_PAGES)
+            layout.measure(tab.state["doc"], start, stop)
+            if stop < len(layout): self.root.after(1, self.measure_layout, doc_key, stop)
+            return
+        stop = min(len(self.page_coords), start + LAYOUT_CHUNK_PAGES)
+        anchor = min(self.current_page_index, len(self.page_coords) - 1)
+        offset = self.canvas.canvasy(0) - self.page_coords[anchor]['y']
+        old = self.placed_geometry()
+        with TRACE.span("layout.measure", start=start, stop=stop):
+            changed = self.page_coords.measure(self.doc, start, stop)
+        if changed:
+            self.relayout(old)
+            self.canvas.yview_moveto((self.page_coords[anchor]['y'] + offset) / self.page_coords.size()[1])
+        if stop < len(self.page_coords):
+            self.root.after(1, self.measure_layout, doc_key, stop)
+        elif self.open_started is not None:
+            self.mark_timing("open_to_layout_complete", self.open_started)
+            if self.timing: self.print_timings("open")
+
+    def print_timings(self, prefix):
+        labels = [("startup_interpreter", "interpreter start -> module load"),
+                  ("startup_window_shown", "module load -> window shown"),
+                  ("open_to_layout_shown", "file open -> view laid out"),
+                  ("open_to_first_pixel", "file open -> first page preview"),
+                  ("open_to_first_page", "file open -> first page painted"),
+                  ("open_to_layout_complete", "file open -> all pages measured")]
+        for key, label in labels:
+            if key.startswith(prefix) and key in self.timings: print(f"{label:34s} {self.timings[key]:8.1f} ms")
+        if prefix == "open":
+            # Per page over the session so far, from the page being wanted to something / the sharp render shown
+            for stage, stats in self.paint_stats().items():
+                print(f"{'page request -> ' + stage.replace('_', ' '):34s} {stats['median_ms']:8.1f} ms median, "
+                      f"{stats['avg_ms']:.1f} avg over {stats['count']} pages")
+
+    def ask_save_path(self, title):
+        folder, name = os.path.split(self.current_file_path or "")
+        return filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf")],
+                                            title=title, initialdir=folder or None, initialfile=name or None)
+
+    def is_current_file(self, path):
+        return bool(self.current_file_path) and \
+            os.path.normcase(os.path.abspath(path)) == os.path.normcase(os.path.abspath(self.current_file_path))
 
     def save_pdf(self):
+        # Fast path: edits saved back to the open file are appended as an incremental update
         if not self.doc: return
-        path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf")])
-        if path:
-            try:
-                self.doc.save(path, garbage=4)
-                messagebox.showinfo("Success", "PDF Saved Successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not save: {e}")
+        path = self.ask_save_path("Save PDF")
+        if not path: return
+        start = time.perf_counter()
+        try:
+            if self.is_current_file(path) and self.doc.can_save_incrementally():
+                self.doc.saveIncr()
+                self.renderer.set_source(self.doc_key, path=path)
+                self.schedule_visibility_update()
+                self.rehash_document()
+                how = "Incremental update"
+            elif self.is_current_file(path):
+                self.rewrite_open_file()
+                how = "Full rewrite"
+            else:
+                self.doc.save(path)
+                how = "Full write"
+            messagebox.showinfo("Success", f"PDF Saved Successfully!\n{how} took {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save: {e}")
+
+    def optimize_pdf(self):
+        # Slow path: full rewrite with garbage collection, object dedup and compression
+        if not self.doc: return
+        path = self.ask_save_path("Optimize and Compact PDF")
+        if not path: return
+        before = os.path.getsize(self.current_file_path) if self.current_file_path else 0
+        start = time.perf_counter()
+        try:
+            if self.is_current_file(path): self.rewrite_open_file(garbage=4, deflate=True)
+            else: self.doc.save(path, garbage=4, deflate=True)
+            elapsed = time.perf_counter() - start
+            after = os.path.getsize(path)
+            messagebox.showinfo("Success", f"PDF optimized in {elapsed:.2f}s\n"
+                                           f"{before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not optimize: {e}")
+
+    def rewrite_open_file(self, **options):
+        # MuPDF cannot fully rewrite the file it has open: write beside it, swap, reopen
+        path = self.current_file_path
+        self.doc.save(path + ".tmp", **options)
+        self.doc.close()
+        os.replace(path + ".tmp", path)
+        self.doc = fitz.open(path)
+        self.page_cache.discard_doc(self.doc_key)  # garbage collection renumbers xrefs
+        self.renderer.set_source(self.doc_key, path=path)
+        self.drop_text_index()
+        self.rehash_document()
+        self.update_sidebar()
+        self.refresh_view()
+
+    def rehash_document(self, path=None, doc_key=None):
+        # Deferred calls name their document, the tab in front may have changed since
+        if doc_key is None: path, doc_key = self.current_file_path, self.doc_key
+        if doc_key == self.doc_key: self.doc_hash = None
+        threading.Thread(target=self._hash_document, args=(path, doc_key), daemon=True).start()
 
     def jump_to_page_from_entry(self, event=None):
         if not self.doc: return
@@ -455,108 +2722,367 @@ class PDFReader:
         except ValueError:
             pass
 
+    # --- Page Structure Edits (act on the sidebar selection, else the current page) ---
+    def selected_pages(self):
+        sel = self.page_listbox.curselection()
+        return list(sel) if sel else [self.current_page_index]
+
     def rotate_current_page(self):
         if not self.doc: return
-        idx = self.current_page_index
-        self.doc[idx].set_rotation(self.doc[idx].rotation + 90)
-        self.refresh_view()
+        pages = self.selected_pages()
+        for i in pages: self.doc[i].set_rotation(self.doc[i].rotation + 90)
+        self.renderer.rotate_source(self.doc_key, {i: self.doc[i].rotation for i in pages})
+        self.apply_page_edit(range(len(self.doc)), changed=pages)
 
     def move_page_up(self):
-        if not self.doc: return
-        idx = self.get_selected_sidebar_page() or self.current_page_index
-        if idx > 0:
-            self.doc.move_page(idx, idx - 1)
-            self.update_sidebar()
-            self.page_listbox.selection_set(idx - 1)
-            self.go_to_page(idx - 1)
-            self.refresh_view()
+        self.move_pages(-1)
 
     def move_page_down(self):
+        self.move_pages(1)
+
+    def move_pages(self, step):
+        """Shifts every selected page one slot up (-1) or down (+1); adjacent pages move as a block"""
         if not self.doc: return
-        idx = self.get_selected_sidebar_page() or self.current_page_index
-        if idx < len(self.doc) - 1:
-            self.doc.move_page(idx + 1, idx)
-            self.update_sidebar()
-            self.page_listbox.selection_set(idx + 1)
-            self.go_to_page(idx + 1)
-            self.refresh_view()
-            
+        pages = self.selected_pages()
+        chosen = set(pages)
+        order = list(range(len(self.doc)))
+        for i in (pages if step < 0 else reversed(pages)):
+            j = i + step
+            if not 0 <= j < len(order) or order[j] in chosen: continue
+            order[i], order[j] = order[j], order[i]
+            self.doc.move_page(max(i, j), min(i, j))
+        if order == sorted(order): return
+        self.apply_page_edit(order)
+        targets = [n for n, o in enumerate(order) if o in chosen]
+        self.page_listbox.selection_clear()
+        for n in targets: self.page_listbox.selection_set(n)
+        self.go_to_page(targets[0])
+
     def delete_current_page(self):
         if not self.doc: return
-        idx = self.get_selected_sidebar_page() or self.current_page_index
-        if messagebox.askyesno("Confirm", f"Delete Page {idx+1}?"):
-            self.doc.delete_page(idx)
-            self.update_sidebar()
-            self.lbl_total_pages.config(text=f"/ {len(self.doc)}")
-            self.refresh_view()
+        pages = self.selected_pages()
+        if len(pages) >= len(self.doc):
+            messagebox.showwarning("Delete", "A PDF must keep at least one page.")
+            return
+        prompt = f"Delete Page {pages[0]+1}?" if len(pages) == 1 else f"Delete {len(pages)} pages?"
+        if messagebox.askyesno("Confirm", prompt):
+            chosen = set(pages)
+            self.doc.delete_pages(pages)
+            self.page_listbox.selection_clear()
+            self.apply_page_edit([i for i in range(len(self.doc) + len(pages)) if i not in chosen])
+
+    def apply_page_edit(self, order, changed=()):
+        """Updates the view in place after a page edit. `order` holds the old index of every page
+        in its new position and `changed` the new indices whose content changed. Renders are cached
+        by page xref, so only changed pages render again; the rest are retagged and shifted."""
+        order, changed = list(order), set(changed)
+        self.renderer.reorder_source(self.doc_key, order)
+        old = self.placed_geometry()
+        self.page_coords.reorder(order, {i: page_size(self.doc, i) for i in changed})
+        self.relayout(old, order, changed)
+        self.tile_jobs.clear()
+        self.prefetching.clear()
+
+        self.page_listbox.reorder(order, changed)
+        self.refresh_search()
+        self.lbl_total_pages.config(text=f"/ {len(self.doc)}")
+        self.current_page_index = min(self.current_page_index, len(self.doc) - 1)
+        self.render_visible_pages()
+
+    def placed_geometry(self):
+        return {i: self.page_coords[i] for i in self.placeholders}
+
+    def relayout(self, old, order=None, drop=()):
+        """Moves what is on the canvas to the current page_coords. `old` is placed_geometry() from
+        before the layout changed, `order` the old index of every page in its new position (None
+        when only sizes changed) and `drop` the pages whose items must go."""
+        start = time.perf_counter()
+        self.calculate_layout()
+        new_index = {o: n for n, o in enumerate(order)} if order is not None else None
+        remap = {}
+        for o in old:
+            n = new_index.get(o) if new_index is not None else o
+            if n is None or n in drop: self._drop_page_items(o)
+            else: remap[o] = n
+        items = {o: self.canvas.find_withtag(f"img_{o}") + self.canvas.find_withtag(f"hit_{o}") for o in remap}
+        for o, n in remap.items():
+            c = self.page_coords[n]
+            dx, dy = c['x'] - old[o]['x'], c['y'] - old[o]['y']
+            for item in items[o]:
+                if n != o:
+                    tags = [self._retag(t, o, n) for t in self.canvas.gettags(item) if t != "current"]
+                    self.canvas.itemconfigure(item, tags=tags)
+                if dx or dy: self.canvas.move(item, dx, dy)
+        for table in (self.page_images, self.preview_images, self.paint_started, self.placeholders):
+            moved = {remap[o]: table.pop(o) for o in list(table) if o in remap}
+            table.update(moved)
+        self.highlighted = {remap[o] for o in self.highlighted if o in remap}
+        for i, placeholder in self.placeholders.items(): self._position_placeholder(i, placeholder)
+        TRACE.add("layout.relayout", start, moved=len(remap))
+
+    def _drop_page_items(self, i):
+        self.canvas.delete(f"img_{i}")
+        self.canvas.delete(f"hit_{i}")
+        self.highlighted.discard(i)
+        for table in (self.page_images, self.preview_images, self.paint_started, self.tile_jobs):
+            table.pop(i, None)
+        items = self.placeholders.pop(i, None)
+        if items:
+            for item in items: self.canvas.itemconfigure(item, state=tk.HIDDEN)
+            self.spare_placeholders.append(items)
+
+    @staticmethod
+    def _retag(tag, old, new):
+        # Canvas tags carry the page index: img_<i>, preview_<i>, tile_<i>_<tx>_<ty>, hit_<i>
+        name, _, rest = tag.partition("_")
+        index, sep, tail = rest.partition("_")
+        if name in ("img", "preview", "tile", "hit") and index == str(old): return f"{name}_{new}{sep}{tail}"
+        return tag
 
     def update_sidebar(self):
-        self.page_listbox.delete(0, tk.END)
+        self.page_listbox.set_count(len(self.doc) if self.doc else 0)
+
+    def request_thumbnail(self, i):
+        # Needs the content hash first, so thumbnails can go to the on-disk cache
+        if not self.doc or not self.doc_hash or i >= len(self.doc): return
+        w, h = max(1, self.page_coords.widths[i]), max(1, self.page_coords.heights[i])
+        zoom = min(THUMB_BOX[0] / w, THUMB_BOX[1] / h)
+        xref = self.doc.page_xref(i)
+        rotation = self.doc.xref_get_key(xref, "Rotate")[1]
+        key = (self.doc_key, xref, rotation, PageCache.zoom_bucket(zoom), False, None)
+        img = self.page_cache.get(key)
+        if img is not None:
+            self.page_listbox.set_thumbnail(i, img)
+            return
+        if self.renderer.is_pending(self.doc_key, i, zoom, kind="thumb"): return
+        def on_thumbnail(i, img):
+            self.page_cache.put(key, img)
+            self.page_listbox.set_thumbnail(i, img)
+        disk_path = os.path.join(CACHE_DIR, "thumbs", self.doc_hash, f"{xref}_{rotation}.png")
+        self.renderer.submit(self.doc_key, i, zoom, False, on_thumbnail,
+                             priority=PRIORITY_THUMBNAIL, disk_path=disk_path, kind="thumb")
+
+    def _hash_document(self, path, doc_key):
+        try: digest = file_digest(path)
+        except OSError: return
+        touch_cached(digest)
+        try: self.root.after(0, self._set_doc_hash, doc_key, digest)
+        except RuntimeError: pass
+
+    def _set_doc_hash(self, doc_key, digest):
+        if doc_key != self.doc_key:
+            tab = self.tab_for_key(doc_key)
+            if tab is not None: tab.state["doc_hash"] = digest
+            return
+        self.doc_hash = digest
+        self.page_listbox.redraw()
+        self.start_indexing(digest)
+
+    # --- Full-Text Search ---
+    def start_indexing(self, digest):
+        # Page xrefs survive incremental saves, so a finished index is just stored under the new hash
+        index = self.text_index
+        if index is None:
+            index = self.text_index = TextIndex()
+            threading.Thread(target=self._index_document, args=(self.current_file_path, digest, index),
+                             daemon=True).start()
+        elif index.complete:
+            threading.Thread(target=index.save, args=(TextIndex.cache_path(digest),), daemon=True).start()
+
+    def drop_text_index(self):
+        if self.text_index: self.text_index.cancelled = True
+        self.text_index = None
+
+    def _index_document(self, path, digest, index):
+        # Runs on a background thread with its own document handle
+        cache = TextIndex.cache_path(digest)
+        try: loaded = os.path.exists(cache) and index.load(cache)
+        except (OSError, EOFError, ValueError, KeyError): loaded = False
+        if not loaded:
+            def progress(done, total):
+                try: self.root.after(0, self._indexing_progress, index, done, total)
+                except RuntimeError: pass
+            try:
+                index.build(path, progress)
+                if not index.complete: return
+                index.save(cache)
+            except Exception as e:
+                print(f"Could not index {path}: {e}")
+                if not index.complete: return
+        try: self.root.after(0, self._indexing_done, index)
+        except RuntimeError: pass
+
+    def _indexing_progress(self, index, done, total):
+        if index is self.text_index and not self.search_hits:
+            self.lbl_search.config(text=f"Indexing {done}/{total}")
+
+    def _indexing_done(self, index):
+        if index is not self.text_index: return
+        if self.search_query: self.run_search(self.search_query)
+        else: self.lbl_search.config(text="")
+
+    def focus_search(self):
+        self.ent_search.focus_set()
+        self.ent_search.select_range(0, tk.END)
+
+    def run_search(self, query):
+        self.search_query = query
+        self.search_hits = []
+        if self.doc and self.text_index:
+            xrefs = [self.doc.page_xref(i) for i in range(len(self.doc))]
+            self.search_hits = self.text_index.search(query, xrefs)
+        self.hit_pages = {}
+        for n, (i, _) in enumerate(self.search_hits): self.hit_pages.setdefault(i, []).append(n)
+        self.search_pos = -1
+        self.canvas.delete("hit")
+        self.highlighted.clear()
+        self.update_search_label()
+        self.update_highlights(set(self.placeholders))
+
+    def search_step(self, step):
         if not self.doc: return
-        for i in range(len(self.doc)):
-            self.page_listbox.insert(tk.END, f"Page {i+1}")
+        query = self.search_var.get()
+        if query != self.search_query:
+            self.run_search(query)
+            if not self.search_hits: return
+            # Start from the first hit at or after the page being read, whichever way was asked
+            prev = None
+            self.search_pos = next((n for n, (i, _) in enumerate(self.search_hits) if i >= self.current_page_index), 0)
+        else:
+            if not self.search_hits: return
+            prev = self.search_hits[self.search_pos][0] if self.search_pos >= 0 else None
+            self.search_pos = (self.search_pos + step) % len(self.search_hits)
+        i, boxes = self.search_hits[self.search_pos]
+        for page in {prev, i}: self.redraw_highlights(page)
+        self.update_search_label()
+        self.go_to_page(i)
+        c, z = self.page_coords[i], self.page_coords.zoom
+        rect = fitz.Rect(boxes[0]) * self.doc[i].rotation_matrix
+        view_h = self.canvas.winfo_height()
+        self.canvas.yview_moveto(max(0, c['y'] + rect.y0 * z - view_h / 3) / self.page_coords.size()[1])
+
+    def refresh_search(self):
+        # Hits are per page index, so page edits re-run the query against the new order
+        if self.search_query: self.run_search(self.search_query)
+
+    def clear_search(self):
+        self.search_var.set("")
+        self.search_query = ""
+        self.search_hits = []
+        self.hit_pages = {}
+        self.search_pos = -1
+        self.canvas.delete("hit")
+        self.highlighted.clear()
+        self.update_search_label()
+
+    def update_search_label(self):
+        if not self.search_query: text = ""
+        elif not self.search_hits: text = "No matches"
+        else: text = f"{self.search_pos + 1}/{len(self.search_hits)}"
+        if self.search_query and self.text_index and not self.text_index.complete: text += " (indexing)"
+        self.lbl_search.config(text=text)
+
+    def update_highlights(self, visible):
+        # Like page images, highlight rectangles exist only for pages near the viewport
+        for i in [i for i in self.highlighted if i not in visible]:
+            self.canvas.delete(f"hit_{i}")
+            self.highlighted.discard(i)
+        for i in visible:
+            if i in self.hit_pages and i not in self.highlighted: self.draw_highlights(i)
+
+    def redraw_highlights(self, i):
+        if i not in self.highlighted: return
+        self.canvas.delete(f"hit_{i}")
+        self.draw_highlights(i)
+
+    def draw_highlights(self, i):
+        c, z = self.page_coords[i], self.page_coords.zoom
+        m = self.doc[i].rotation_matrix  # boxes are in unrotated page space
+        for n in self.hit_pages[i]:
+            color = "#ff8c00" if n == self.search_pos else "#ffd700"
+            for box in self.search_hits[n][1]:
+                r = fitz.Rect(box) * m
+                self.canvas.create_rectangle(c['x'] + r.x0 * z, c['y'] + r.y0 * z, c['x'] + r.x1 * z, c['y'] + r.y1 * z,
+                                             fill=color, outline=color, stipple="gray50", tags=("hit", f"hit_{i}"))
+        self.highlighted.add(i)
+        self.canvas.tag_raise("hit")
 
     def on_sidebar_click(self, event):
         sel = self.page_listbox.curselection()
-        if sel: self.go_to_page(sel[0])
-            
-    def get_selected_sidebar_page(self):
-        sel = self.page_listbox.curselection()
-        if sel: return sel[0]
-        return None
+        if len(sel) == 1: self.go_to_page(sel[0])
+
+    def sync_sidebar_selection(self, i):
+        # The sidebar follows the current page, but leaves a multi-page selection alone
+        if len(self.page_listbox.curselection()) > 1: return
+        self.page_listbox.selection_clear(0, tk.END)
+        self.page_listbox.selection_set(i)
+        self.page_listbox.see(i)
 
     def change_layout(self, mode):
         self.layout_mode = mode
         self.refresh_view()
 
-    def refresh_view(self):
+    def refresh_view(self, anchor=None):
+        self.zoom_gesture = None
+        self.renderer.invalidate()
         self.page_images.clear()
+        self.tile_jobs.clear()
+        self.preview_images.clear()
+        self.paint_started.clear()
         self.canvas.delete("all")
+        self.placeholders.clear()
+        self.spare_placeholders.clear()
+        self.highlighted.clear()
+        self.prefetching.clear()
         self.calculate_layout()
+        if anchor: self.scroll_to_anchor(anchor)
         self.render_visible_pages()
+        self.page_listbox.schedule_refresh()  # thumbnail jobs were cancelled along with the rest
 
     def calculate_layout(self):
         if not self.doc: return
-        self.canvas.delete("placeholder")
-        self.page_coords = []
-        
-        PADDING = 40
-        current_y = PADDING
-        max_row_h = 0
-        total_width = 0
-        
-        for i in range(len(self.doc)):
-            page = self.doc[i]
-            rect = page.rect
-            w = rect.width * self.zoom_level
-            h = rect.height * self.zoom_level
-            
-            x, y = PADDING, current_y
-            
-            if self.layout_mode == "single":
-                current_y += h + PADDING
-                total_width = max(total_width, w + PADDING*2)
-            elif self.layout_mode == "double":
-                is_right = (i % 2 == 1)
-                if not is_right: max_row_h = h
-                else:
-                    prev_w = self.page_coords[-1]['w']
-                    x = PADDING + prev_w + PADDING
-                    max_row_h = max(max_row_h, h)
-                if is_right or i == len(self.doc)-1:
-                    current_y += max_row_h + PADDING
-                total_width = max(total_width, x + w + PADDING)
-
-            self.page_coords.append({'x': x, 'y': y, 'w': w, 'h': h})
-            
-            self.canvas.create_rectangle(x+8, y+8, x+w+8, y+h+8, fill=COLORS["shadow"], outline="", tags=("placeholder", f"ph_{i}"))
-            self.canvas.create_rectangle(x, y, x+w, y+h, fill="white", outline="#333", tags=("placeholder", f"ph_{i}"))
-            self.canvas.create_text(x-10, y+10, text=str(i+1), anchor=tk.NE, fill=COLORS["text"], font=("Segoe UI", 10))
-
-        self.canvas.config(scrollregion=(0, 0, total_width, current_y))
+        # Geometry was measured once at open; a zoom or layout change only rescales it
+        with TRACE.span("layout.calculate", pages=len(self.page_coords), mode=self.layout_mode):
+            self.page_coords.set_view(self.zoom_level, self.layout_mode)
+            total_width, total_height = self.page_coords.size()
+        self.canvas.config(scrollregion=(0, 0, total_width, total_height))
         self.update_zoom_label()
 
+    def update_placeholders(self, visible):
+        # Placeholder items exist only for pages near the viewport and are recycled on scroll
+        for i in [i for i in self.placeholders if i not in visible]:
+            items = self.placeholders.pop(i)
+            for item in items: self.canvas.itemconfigure(item, state=tk.HIDDEN)
+            self.spare_placeholders.append(items)
+        for i in visible:
+            if i in self.placeholders: continue
+            if self.spare_placeholders:
+                items = self.spare_placeholders.pop()
+                for item in items: self.canvas.itemconfigure(item, state=tk.NORMAL)
+            else:
+                shadow = self.canvas.create_rectangle(0, 0, 0, 0, fill=COLORS["shadow"], outline="", tags="placeholder")
+                rect = self.canvas.create_rectangle(0, 0, 0, 0, fill="white", outline="#333", tags="placeholder")
+                label = self.canvas.create_text(0, 0, anchor=tk.NE, fill=COLORS["text"], font=("Segoe UI", 10), tags="placeholder")
+                self.canvas.tag_lower(rect)
+                self.canvas.tag_lower(shadow)
+                items = (shadow, rect, label)
+            self._position_placeholder(i, items)
+            self.placeholders[i] = items
+
+    def _position_placeholder(self, i, items):
+        shadow, rect, label = items
+        c = self.page_coords[i]
+        x, y, w, h = c['x'], c['y'], c['w'], c['h']
+        self.canvas.coords(shadow, x+8, y+8, x+w+8, y+h+8)
+        self.canvas.coords(rect, x, y, x+w, y+h)
+        self.canvas.coords(label, x-10, y+10)
+        self.canvas.itemconfigure(label, text=str(i+1))
+
     def on_resize_window(self, event):
+        # Bound on the root, so every child widget's <Configure> arrives here too (new sidebars,
+        # the tab strip, labels changing size); only a real window resize refits the page
+        if event.widget is not self.root or (event.width, event.height) == self.window_size: return
+        self.window_size = (event.width, event.height)
         if self.resize_timer:
             self.root.after_cancel(self.resize_timer)
         self.resize_timer = self.root.after(200, self.fit_width)
@@ -590,10 +3116,39 @@ class PDFReader:
         self.canvas.xview_scroll(delta, "units")
 
     def on_zoom_scroll(self, event):
-        if event.delta > 0 or event.num == 4: self.zoom_in()
-        else: self.zoom_out()
+        # Each wheel step only moves the canvas items; the layout and re-render wait until the gesture settles
+        step = 1.25 if event.delta > 0 or event.num == 4 else 1 / 1.25
+        if self.doc:
+            if self.zoom_settle_job is not None: self.root.after_cancel(self.zoom_settle_job)
+            self.zoom_settle_job = self.root.after(ZOOM_SETTLE_MS, self.finish_zoom)
+            self.scale_view(self.zoom_level * step, event.x, event.y)
         return "break"
 
+    def scale_view(self, new_level, x, y):
+        """Mid-gesture zoom about widget point (x, y): scales the existing canvas items and the
+        scroll region, no layout and no rendering. Page images keep their pixel size until
+        finish_zoom lays the pages out again."""
+        new_level = max(self.min_zoom, min(self.max_zoom, new_level))
+        factor = new_level / self.zoom_level
+        if factor == 1: return
+        cx, cy = self.canvas.canvasx(x), self.canvas.canvasy(y)
+        s, dx, dy = self.zoom_gesture[:3] if self.zoom_gesture else (1.0, 0.0, 0.0)
+        self.zoom_gesture = (s * factor, cx + (dx - cx) * factor, cy + (dy - cy) * factor, x, y)
+        self.zoom_level = new_level
+        self.canvas.scale("all", cx, cy, factor, factor)
+        region = self.canvas.cget("scrollregion").split()
+        if region:
+            x0, y0, x1, y1 = map(float, region)
+            self.canvas.config(scrollregion=(cx + (x0 - cx) * factor, cy + (y0 - cy) * factor,
+                                             cx + (x1 - cx) * factor, cy + (y1 - cy) * factor))
+        self.update_zoom_label()
+
+    def finish_zoom(self):
+        self.zoom_settle_job = None
+        if self.zoom_gesture is None: return
+        anchor = self.zoom_anchor(*self.zoom_gesture[3:])
+        self.refresh_view(anchor)
+
     def zoom_in(self):  self._set_zoom(self.zoom_level * 1.25)
     def zoom_out(self): self._set_zoom(self.zoom_level / 1.25)
     
@@ -607,88 +3162,542 @@ class PDFReader:
         target = (canvas_w - sb_width - 120) / (page_w * factor)
         self._set_zoom(target)
 
-    def _set_zoom(self, new_level):
+    def _set_zoom(self, new_level, x=None, y=None):
+        """Zooms about widget point (x, y), the middle of the view by default, keeping the document point under it in place"""
+        if not self.doc: return
+        anchor = self.zoom_anchor(x, y)
         self.zoom_level = max(self.min_zoom, min(self.max_zoom, new_level))
-        top_page = getattr(self, 'current_page_index', 0)
-        self.refresh_view()
-        self.go_to_page(top_page)
+        self.refresh_view(anchor)
+
+    def zoom_anchor(self, x=None, y=None):
+        # The page nearest the point and where on it the point falls, as fractions of its size
+        if x is None: x, y = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+        cx, cy = self.canvas.canvasx(x), self.canvas.canvasy(y)
+        if self.zoom_gesture:
+            # Mid-gesture the items are a scaled copy of the layout: map the point back onto it
+            s, dx, dy = self.zoom_gesture[:3]
+            cx, cy = (cx - dx) / s, (cy - dy) / s
+        row = self.page_coords.pages_between(cy, cy)
+        if not row: return None
+        coords = self.page_coords
+        i = next((p for p in row if coords[p]['x'] <= cx < coords[p]['x'] + coords[p]['w']), row[0])
+        c = coords[i]
+        return (x, y, i, (cx - c['x']) / c['w'], (cy - c['y']) / c['h'])
+
+    def scroll_to_anchor(self, anchor):
+        x, y, i, fx, fy = anchor
+        c = self.page_coords[i]
+        total_w, total_h = self.page_coords.size()
+        self.canvas.xview_moveto((c['x'] + fx * c['w'] - x) / total_w)
+        self.canvas.yview_moveto((c['y'] + fy * c['h'] - y) / total_h)
 
     def update_zoom_label(self):
         self.lbl_zoom.config(text=f"{int(self.zoom_level * 100)}%")
 
-    def check_visibility_loop(self):
-        if self.doc:
-            self.render_visible_pages()
-            y = self.canvas.canvasy(0) + 20
-            for i, c in enumerate(self.page_coords):
-                if c['y'] <= y < c['y'] + c['h']:
-                    if self.current_page_index != i:
-                        self.current_page_index = i
-                        if self.root.focus_get() != self.ent_page:
-                            self.page_entry_var.set(str(i+1))
-                        self.page_listbox.selection_clear(0, tk.END)
-                        self.page_listbox.selection_set(i)
-                        self.page_listbox.see(i)
-                    break
-        self.root.after(150, self.check_visibility_loop)
+    # The canvas reports every view change (wheel, scrollbar, hand drag, resize, zoom)
+    # through its scroll commands; updates are coalesced to one per frame
+    def on_canvas_yview(self, *args):
+        self.v_scroll.set(*args)
+        self.schedule_visibility_update()
+
+    def on_canvas_xview(self, *args):
+        self.h_scroll.set(*args)
+        self.schedule_visibility_update()
+
+    def schedule_visibility_update(self):
+        if self.visibility_job is None:
+            self.visibility_job = self.root.after(16, self.update_visibility)
+
+    def update_visibility(self):
+        self.visibility_job = None
+        if not self.doc or self.zoom_gesture: return  # items no longer match the layout until finish_zoom
+        with TRACE.span("frame.update"):
+            self._update_visibility()
+        if TRACE.enabled:
+            # Idle callbacks run after the canvas redisplay that this frame queued
+            done = time.perf_counter()
+            self.root.after_idle(lambda: TRACE.add("frame.redraw", done))
+
+    def _update_visibility(self):
+        self.track_scroll()
+        visible = self.render_visible_pages()
+        self.prefetch_pages(visible)
+        i = self.page_coords.page_at(self.canvas.canvasy(0) + 20)
+        if i is not None and self.current_page_index != i:
+            self.current_page_index = i
+            if self.root.focus_get() != self.ent_page:
+                self.page_entry_var.set(str(i+1))
+            self.sync_sidebar_selection(i)
 
     def render_visible_pages(self):
         if not self.doc: return
         view_top = self.canvas.canvasy(0)
         view_h = self.canvas.winfo_height()
         view_bot = view_top + view_h
+        view_left = self.canvas.canvasx(0)
+        view_right = view_left + self.canvas.winfo_width()
         buffer = 800 
-        visible = set()
-        for i, c in enumerate(self.page_coords):
-            if (c['y'] + c['h'] > view_top - buffer) and (c['y'] < view_bot + buffer):
-                visible.add(i)
-                if i not in self.page_images:
-                    self._render_page(i)
+        visible = set(self.page_coords.pages_between(view_top - buffer, view_bot + buffer))
+        self.update_placeholders(visible)
+        for i in sorted(visible):
+            c = self.page_coords[i]
+            if self.uses_tiles(c):
+                self._render_tiles(i, c, view_left, view_top, view_right, view_bot)
+            elif i not in self.page_images:
+                self._render_page(i)
         for k in list(self.page_images.keys()):
             if k not in visible:
                 self.canvas.delete(f"img_{k}")
                 del self.page_images[k]
-
-    def _render_page(self, i):
-        try:
-            page = self.doc.load_page(i)
-            mat = fitz.Matrix(self.zoom_level, self.zoom_level)
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            
-            if self.text_only_mode.get():
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                draw = ImageDraw.Draw(img)
-                for item in page.get_images(full=True):
-                    xref = item[0]
-                    for r in page.get_image_rects(xref):
-                        x0, y0, x1, y1 = [v * self.zoom_level for v in (r.x0, r.y0, r.x1, r.y1)]
-                        draw.rectangle([x0, y0, x1, y1], fill="white")
-                tk_img = ImageTk.PhotoImage(img)
-            else:
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                tk_img = ImageTk.PhotoImage(img)
-
-            self.page_images[i] = tk_img
+        for k in [k for k in self.preview_images if k not in visible]:
+            self.canvas.delete(f"img_{k}")
+            del self.preview_images[k]
+        for k in [k for k in self.paint_started if k not in visible]:
+            del self.paint_started[k]
+        for k in [k for k in self.tile_jobs if k not in visible]:
+            for tile in self.tile_jobs.pop(k):
+                self.renderer.cancel(self.doc_key, k, self.zoom_level, tile, self.text_only_mode.get())
+        self.update_highlights(visible)
+        return visible
+
+    def track_scroll(self):
+        y, now = self.canvas.canvasy(0), time.perf_counter()
+        dy, dt = y - self.scroll_y, max(now - self.scroll_time, 1e-3)
+        self.scroll_y, self.scroll_time = y, now
+        if abs(dy) < 1: return
+        self.scroll_velocity = dy / dt
+        direction = 1 if dy > 0 else -1
+        if direction != self.scroll_dir:
+            # Reversed: whatever was queued ahead is now behind us
+            self.scroll_dir = direction
+            text_only = self.text_only_mode.get()
+            for i in self.prefetching: self.renderer.cancel(self.doc_key, i, self.zoom_level, text_only=text_only)
+            self.prefetching.clear()
+
+    def prefetch_pages(self, visible):
+        """Queues low-priority renders for the pages ahead of the viewport in the scroll direction"""
+        if not visible: return
+        view_h = max(1, self.canvas.winfo_height())
+        depth = min(PREFETCH_MAX_PAGES, PREFETCH_PAGES + int(abs(self.scroll_velocity) / view_h))
+        budget = min(PREFETCH_MB * 1024 * 1024, self.page_cache.budget // 2)
+        if self.scroll_dir > 0: ahead = range(max(visible) + 1, len(self.page_coords))
+        else: ahead = range(min(visible) - 1, -1, -1)
+
+        wanted = set()
+        for i in ahead:
             c = self.page_coords[i]
-            self.canvas.create_image(c['x'], c['y'], image=tk_img, anchor=tk.NW, tags=f"img_{i}")
-            self.canvas.tag_raise(f"img_{i}", "placeholder")
+            budget -= c['w'] * c['h'] * 3
+            if len(wanted) >= depth or budget < 0 or self.uses_tiles(c): break
+            wanted.add(i)
+            if self.page_cache_key(i) in self.page_cache: continue
+            if self.renderer.is_pending(self.doc_key, i, self.zoom_level, text_only=self.text_only_mode.get()): continue
+            self.renderer.submit(self.doc_key, i, self.zoom_level, self.text_only_mode.get(),
+                                 self._on_rendered(i), priority=PRIORITY_PREFETCH)
+        for i in self.prefetching - wanted - visible:
+            self.renderer.cancel(self.doc_key, i, self.zoom_level, text_only=self.text_only_mode.get())
+        self.prefetching = wanted
+
+    def uses_tiles(self, c):
+        # Huge pixmaps are only ever partly on screen, so render those in tiles
+        return c['w'] * c['h'] > TILE_PAGE_PIXELS
+
+    def _render_tiles(self, i, c, left, top, right, bot):
+        margin = TILE_SIZE // 2
+        cols = int(c['w'] - 1) // TILE_SIZE
+        rows = int(c['h'] - 1) // TILE_SIZE
+        tx0 = max(0, int(left - margin - c['x']) // TILE_SIZE)
+        tx1 = min(cols, int(right + margin - c['x']) // TILE_SIZE)
+        ty0 = max(0, int(top - margin - c['y']) // TILE_SIZE)
+        ty1 = min(rows, int(bot + margin - c['y']) // TILE_SIZE)
+        wanted = {(tx, ty) for tx in range(tx0, tx1 + 1) for ty in range(ty0, ty1 + 1)}
+
+        tiles = self.page_images.get(i)
+        if not isinstance(tiles, dict):
+            self.canvas.delete(f"img_{i}")
+            tiles = self.page_images[i] = {}
+        for tile in list(tiles):
+            if tile not in wanted:
+                self.canvas.delete(f"tile_{i}_{tile[0]}_{tile[1]}")
+                del tiles[tile]
+        for tile in self.tile_jobs.pop(i, set()) - wanted:
+            self.renderer.cancel(self.doc_key, i, self.zoom_level, tile, self.text_only_mode.get())
+        self.tile_jobs[i] = wanted
+        for tile in wanted:
+            if tile not in tiles: self._render_page(i, tile)
+
+    def page_cache_key(self, i, tile=None):
+        xref = self.doc.page_xref(i)
+        rotation = self.doc.xref_get_key(xref, "Rotate")[1]
+        return (self.doc_key, xref, rotation, PageCache.zoom_bucket(self.zoom_level), self.text_only_mode.get(), tile)
+
+    def _render_page(self, i, tile=None):
+        text_only = self.text_only_mode.get()
+        if self.renderer.is_pending(self.doc_key, i, self.zoom_level, tile, text_only):
+            self.renderer.promote(self.doc_key, i, self.zoom_level, tile, text_only=text_only)
+            return
+        if tile is None: self.paint_started.setdefault(i, [time.perf_counter(), False])
+        key = self.page_cache_key(i, tile)
+        img = self.page_cache.get(key)
+        if img is not None:
+            self._place_page(i, img, tile)
+            return
+        if tile is None: self._show_preview(i, key)
+        # Rasterization happens on the render pool; the callback runs back on the Tk thread
+        self.renderer.submit(self.doc_key, i, self.zoom_level, self.text_only_mode.get(),
+                             self._on_rendered(i, tile), tile)
+
+    def _on_rendered(self, i, tile=None):
+        # A prefetch job promoted to visible keeps this callback, so it places the image too
+        key = self.page_cache_key(i, tile)
+        def on_rendered(i, img):
+            self.page_cache.put(key, img)
+            self._place_page(i, img, tile)
+        return on_rendered
+
+    def _show_preview(self, i, key):
+        # First pass: rescale any cached render of this page, else queue a low-DPI one ahead of the sharp job
+        if i in self.preview_images: return
+        img = self.page_cache.nearest(key)
+        if img is not None:
+            self._place_preview(i, img)
+            return
+        if self.zoom_level <= PREVIEW_ZOOM * 2: return
+        pkey = key[:3] + (PageCache.zoom_bucket(PREVIEW_ZOOM),) + key[4:]
+        def on_preview(i, img, pkey=pkey):
+            self.page_cache.put(pkey, img)
+            self._place_preview(i, img)
+        self.renderer.submit(self.doc_key, i, PREVIEW_ZOOM, self.text_only_mode.get(), on_preview,
+                             priority=PRIORITY_PREVIEW, kind="preview")
+
+    def _place_preview(self, i, img):
+        if not self.doc or i not in self.placeholders or i in self.page_images or i in self.preview_images: return
+        c = self.page_coords[i]
+        size = (max(1, int(c['w'])), max(1, int(c['h'])))
+        with TRACE.span("tk.preview", page=i):
+            tk_img = img.resized(*size).photo()
+        self.preview_images[i] = tk_img
+        self.canvas.create_image(c['x'], c['y'], image=tk_img, anchor=tk.NW, tags=(f"img_{i}", f"preview_{i}"))
+        self.canvas.tag_raise(f"img_{i}", "placeholder")
+        self.canvas.tag_raise("hit")
+        self._record_paint(i, "first_pixel")
+
+    def _record_paint(self, i, stage):
+        entry = self.paint_started.get(i)
+        if entry is None: return
+        elapsed = (time.perf_counter() - entry[0]) * 1000
+        if not entry[1]:
+            entry[1] = True
+            self.paint_times["first_pixel"].append(elapsed)
+            if self.open_started is not None and "open_to_first_pixel" not in self.timings:
+                self.mark_timing("open_to_first_pixel", self.open_started)
+        if stage == "sharp":
+            self.paint_times["sharp"].append(elapsed)
+            del self.paint_started[i]
+            if self.open_started is not None and "open_to_first_page" not in self.timings:
+                self.mark_timing("open_to_first_page", self.open_started)
+                self.run_after_first_paint()
+
+    def paint_stats(self):
+        """Average/median ms from page request to first pixel and to the sharp render"""
+        stats = {}
+        for stage, samples in self.paint_times.items():
+            ordered = sorted(samples)
+            stats[stage] = {"count": len(ordered),
+                            "avg_ms": sum(ordered) / len(ordered) if ordered else 0.0,
+                            "median_ms": ordered[len(ordered) // 2] if ordered else 0.0}
+        return stats
+
+    def _place_page(self, i, img, tile=None):
+        if not self.doc or i not in self.placeholders: return
+        c = self.page_coords[i]
+        tags = (f"img_{i}",)
+        if tile is None:
+            if i in self.page_images: return
+            x, y = c['x'], c['y']
+        else:
+            tiles = self.page_images.get(i)
+            if not isinstance(tiles, dict) or tile in tiles: return
+            x, y = c['x'] + tile[0] * TILE_SIZE, c['y'] + tile[1] * TILE_SIZE
+            tags += (f"tile_{i}_{tile[0]}_{tile[1]}",)
+        try:
+            with TRACE.span("tk.photoimage", page=i, tile=tile):
+                tk_img = img.photo()
+            if tile is None: self.page_images[i] = tk_img
+            else: tiles[tile] = tk_img
+            with TRACE.span("tk.canvas", page=i):
+                self.canvas.create_image(x, y, image=tk_img, anchor=tk.NW, tags=tags)
+                self.canvas.tag_raise(f"img_{i}", "placeholder")
+                self.canvas.tag_raise("hit")
+            if tile is None:
+                self.canvas.delete(f"preview_{i}")
+                self.preview_images.pop(i, None)
+                self._record_paint(i, "sharp")
         except Exception as e:
             print(f"Render error page {i}: {e}")
 
+    # --- Performance Overlay ---
+    def toggle_perf_overlay(self):
+        if self.perf_job is None:
+            TRACE.enabled = True
+            self.perf_frame.place(relx=1.0, x=-24, y=8, anchor=tk.NE)
+            self.btn_perf.config(bg=COLORS["accent"], fg="white")
+            self.update_perf_overlay()
+        else:
+            self.root.after_cancel(self.perf_job)
+            self.perf_job = None
+            self.perf_frame.place_forget()
+            self.btn_perf.config(bg=COLORS["toolbar"], fg=COLORS["text"])
+            TRACE.enabled = self.trace_path is not None
+
+    def update_perf_overlay(self):
+        def line(label, samples):
+            if not samples: return f"{label:10s}      -"
+            ordered = sorted(samples)
+            return f"{label:10s} {ordered[len(ordered) // 2]:6.1f} ms  max {ordered[-1]:6.1f}  n={len(ordered)}"
+        recent = TRACE.recent()
+        cache = self.page_cache.stats()
+        paint = self.paint_stats()
+        rss = rss_mb()
+        rows = [line("frame", recent.get("frame.update")),
+                line("redraw", recent.get("frame.redraw")),
+                line("mupdf", recent.get("render.mupdf")),
+                line("parse", recent.get("render.parse")),
+                line("ppm", recent.get("render.ppm")),
+                line("photoimg", recent.get("tk.photoimage")),
+                line("queued", recent.get("render.queue_wait")),
+                line("layout", recent.get("layout.calculate", []) + recent.get("layout.measure", [])),
+                f"to pixel   {paint['first_pixel']['median_ms']:6.1f} ms  avg {paint['first_pixel']['avg_ms']:6.1f}",
+                f"to sharp   {paint['sharp']['median_ms']:6.1f} ms  avg {paint['sharp']['avg_ms']:6.1f}",
+                f"cache      {cache['hit_rate'] * 100:5.1f}% hits  {cache['bytes'] / 2**20:.0f}/{cache['budget'] / 2**20:.0f} MB",
+                f"queue      {len(self.renderer.pending)} jobs pending",
+                f"memory     {rss:.0f} MB RSS" if rss is not None else "memory     n/a"]
+        self.lbl_perf.config(text="\n".join(rows))
+        self.perf_job = self.root.after(500, self.update_perf_overlay)
+
+    def export_trace(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="pdf_reader_trace.json",
+                                            filetypes=[("Chrome Trace", "*.json")])
+        if not path: return
+        try:
+            count = TRACE.export(path)
+            messagebox.showinfo("Trace", f"Wrote {count} spans to {os.path.basename(path)}.\n"
+                                         "Open it in chrome://tracing or ui.perfetto.dev.")
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write trace: {e}")
+
     def on_close(self):
         self.save_history()
+        self.history.close()
+        if self.trace_path:
+            try: print(f"Wrote {TRACE.export(self.trace_path)} spans to {self.trace_path}")
+            except OSError as e: print(f"Could not write trace: {e}")
+        self.renderer.shutdown()
         self.root.destroy()
 
     def go_to_page(self, i):
         if 0 <= i < len(self.page_coords):
             y = self.page_coords[i]['y']
-            self.canvas.yview_moveto(y / self.canvas.bbox("all")[3])
-            self.page_listbox.selection_clear(0, tk.END)
-            self.page_listbox.selection_set(i)
-            self.page_listbox.see(i)
-
-if __name__ == "__main__":
+            self.canvas.yview_moveto(y / self.page_coords.size()[1])
+            self.sync_sidebar_selection(i)
+
+# --- Command Line ---
+def cli_merge(args):
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("merge: no input files", file=sys.stderr)
+        return 2
+
+    def progress(done, total, pages):
+        if not args.quiet:
+            print(f"\r[{done}/{total}] {pages} pages", end="", file=sys.stderr, flush=True)
+
+    try:
+        stats = merge_pdfs(inputs, args.output, progress, args.chunk_pages, args.dedupe, not args.no_compact)
+    except (OSError, RuntimeError) as e:
+        if not args.quiet: print(file=sys.stderr)
+        print(f"merge: {e}", file=sys.stderr)
+        return 1
+    if not args.quiet: print(file=sys.stderr)
+    print(f"Merged {stats['files']} files, {stats['pages']} pages into {args.output} "
+          f"in {stats['seconds']:.2f}s ({stats['pages_per_sec']:.1f} pages/s)")
+    if args.dedupe:
+        print(f"Deduplication saved {stats['saved_bytes']} bytes; output is {stats['size']} bytes")
+    return 0
+
+def cli_split(args):
+    try:
+        with fitz.open(args.source) as doc:
+            total, toc = len(doc), doc.get_toc()
+    except (OSError, RuntimeError) as e:
+        print(f"split: {e}", file=sys.stderr)
+        return 1
+    stem = os.path.splitext(os.path.basename(args.source))[0]
+    try:
+        if args.every: plan = plan_every(total, max(1, args.every), stem)
+        elif args.ranges: plan = plan_ranges(args.ranges, total, stem)
+        else: plan = plan_bookmarks(toc, total, stem, args.level)
+    except ValueError:
+        print("split: invalid range format, use numbers and hyphens (e.g. 1-3, 5)", file=sys.stderr)
+        return 2
+    if not plan:
+        print("split: nothing to split", file=sys.stderr)
+        return 2
+
+    def progress(done, count, pages):
+        if not args.quiet:
+            print(f"\r[{done}/{count}] {pages} pages", end="", file=sys.stderr, flush=True)
+
+    try:
+        stats = split_pdf(args.source, plan, args.output_dir, args.workers, progress)
+    except (OSError, RuntimeError) as e:
+        if not args.quiet: print(file=sys.stderr)
+        print(f"split: {e}", file=sys.stderr)
+        return 1
+    if not args.quiet: print(file=sys.stderr)
+    print(f"Split {args.source} into {stats['files']} files ({stats['pages']} pages) "
+          f"in {stats['seconds']:.2f}s ({stats['pages_per_sec']:.1f} pages/s)")
+    return 0
+
+def cli_export(args):
+    pages = None
+    if args.pages:
+        with fitz.open(args.source) as doc: total = len(doc)
+        try: pages = list(dict.fromkeys(p for group in parse_page_groups(args.pages, total) for p in group))
+        except ValueError:
+            print("export: invalid range format, use numbers and hyphens (e.g. 1-3, 5)", file=sys.stderr)
+            return 2
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"\r[{done}/{total}] pages", end="", file=sys.stderr, flush=True)
+
+    try:
+        stats = export_pages(args.source, args.output_dir, args.format, args.dpi, pages, args.workers, progress,
+                             args.quality)
+    except KeyboardInterrupt:
+        print("\nexport: interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    if not args.quiet: print(file=sys.stderr)
+    print(f"Exported {stats['pages']} pages to {args.output_dir} ({stats['skipped']} already there) "
+          f"in {stats['seconds']:.2f}s ({stats['pages_per_sec']:.1f} pages/s, "
+          f"{stats['pages_per_sec_per_core']:.1f} per core on {stats['workers']} workers)")
+    return 0
+
+def cli_watch(args):
+    service = WatchService(args.root, args.workers, args.queue, args.every, args.settle,
+                           log=lambda msg: print(time.strftime("%H:%M:%S"), msg, flush=True))
+    stats = service.run(args.interval, args.once)
+    line = (f"{stats['jobs']} jobs ({stats['failed']} failed), {stats['pages']} pages in {stats['seconds']:.1f}s: "
+            f"{stats['jobs_per_min']:.1f} jobs/min, {stats['pages_per_sec']:.1f} pages/s")
+    if "latency" in stats:
+        line += f", latency median {stats['latency']['median_ms'] / 1000:.2f}s p95 {stats['latency']['p95_ms'] / 1000:.2f}s"
+    print(line)
+    return 1 if stats["failed"] else 0
+
+def cli_bench(args):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="pdf_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    log = None if args.quiet else (lambda msg: print(msg, file=sys.stderr, flush=True))
+    try:
+        results = run_benchmarks(work_dir, args.quick, log)
+    finally:
+        if not args.work_dir: shutil.rmtree(work_dir, ignore_errors=True)
+    report = {"meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": args.quick,
+                       "python": platform.python_version(), "pymupdf": fitz.VersionBind,
+                       "platform": platform.platform(), "cpus": os.cpu_count()},
+              "results": results}
+    with open(args.output, "w") as f: json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+    if args.compare:
+        with open(args.compare) as f: base = json.load(f)["results"]
+        for name, before, after, change in compare_benchmarks(base, results):
+            print(f"{name:32s} {before:10.2f} ms -> {after:10.2f} ms  {change:+6.1f}%")
+    return 0
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="pdf_reader.py",
+                                     description="PDF reader with split/merge/export and a watch-folder service. Run without a command to open the viewer.")
+    parser.add_argument("--timing", action="store_true",
+                        help="print startup and file-open timings (window shown, first page painted)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record render/layout spans for the whole session and write them to FILE on exit")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("merge", help="merge PDFs without the GUI")
+    p.add_argument("inputs", nargs="+", help="PDF files, glob patterns or @manifest.txt (one path per line)")
+    p.add_argument("-o", "--output", required=True, help="merged PDF to write")
+    p.add_argument("--chunk-pages", type=int, default=MERGE_CHUNK_PAGES,
+                   help="pages kept in memory before appending to the output (default %(default)s)")
+    p.add_argument("--dedupe", action="store_true", help="store fonts, images etc. shared by the inputs only once")
+    p.add_argument("--no-compact", action="store_true",
+                   help="skip the final rewrite that drops what the chunked saves left behind")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    p.set_defaults(func=cli_merge)
+
+    p = sub.add_parser("split", help="split a PDF into many files using all cores")
+    p.add_argument("source", help="PDF to split")
+    p.add_argument("-o", "--output-dir", required=True, help="folder for the parts")
+    how = p.add_mutually_exclusive_group(required=True)
+    how.add_argument("--every", type=int, metavar="N", help="one file per N pages")
+    how.add_argument("--ranges", metavar="SPEC", help="one file per range, e.g. '1-5, 8, 10-12'")
+    how.add_argument("--bookmarks", action="store_true", help="one file per bookmark")
+    p.add_argument("--level", type=int, default=1, help="bookmark level for --bookmarks (default %(default)s)")
+    p.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    p.set_defaults(func=cli_split)
+
+    p = sub.add_parser("export", help="write pages as PNG/JPEG images or text files using all cores")
+    p.add_argument("source", help="PDF to export")
+    p.add_argument("-o", "--output-dir", required=True, help="folder for the page files; existing ones are kept")
+    p.add_argument("-f", "--format", choices=EXPORT_FORMATS, default="png", help="output format (default %(default)s)")
+    p.add_argument("--dpi", type=int, default=150, help="image resolution (default %(default)s)")
+    p.add_argument("--quality", type=int, default=90, help="JPEG quality 1-100 (default %(default)s)")
+    p.add_argument("--pages", metavar="SPEC", help="only these pages, e.g. '1-5, 8, 10-12' (default: all)")
+    p.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    p.set_defaults(func=cli_export)
+
+    p = sub.add_parser("watch", help="run merge/split jobs dropped into a folder, without the GUI",
+                       description="Watches ROOT/inbox for *.json job manifests and *.pdf files. "
+                                   'Manifests: {"merge": ["a.pdf", "parts/*.pdf"], "output": "all.pdf", "dedupe": true} '
+                                   'or {"split": "big.pdf", "every": 10 | "ranges": "1-5, 8" | "bookmarks": 1}, '
+                                   "paths relative to the inbox. A dropped PDF is split every --every pages. "
+                                   "Outputs go to ROOT/out, job files to ROOT/done or ROOT/failed, "
+                                   "and a record per job to ROOT/jobs.jsonl.")
+    p.add_argument("root", help="service folder; inbox/, work/, out/, done/ and failed/ are created in it")
+    p.add_argument("-j", "--workers", type=int, default=None, help="jobs run at once (default: all cores)")
+    p.add_argument("--queue", type=int, default=None,
+                   help="jobs claimed beyond those running; the rest wait in the inbox (default 2 per worker)")
+    p.add_argument("--every", type=int, default=1, help="pages per part for dropped PDFs (default %(default)s)")
+    p.add_argument("--settle", type=float, default=2.0,
+                   help="seconds a file must be unchanged before it is taken (default %(default)s)")
+    p.add_argument("--interval", type=float, default=1.0, help="inbox poll interval in seconds (default %(default)s)")
+    p.add_argument("--once", action="store_true", help="exit once the inbox is empty and all jobs have run")
+    p.set_defaults(func=cli_watch)
+
+    p = sub.add_parser("bench", help="time rendering, layout, scrolling, merge and split on generated PDFs")
+    p.add_argument("-o", "--output", default="bench.json", help="JSON results file (default %(default)s)")
+    p.add_argument("--compare", metavar="BASE", help="earlier results file to compare medians against")
+    p.add_argument("--quick", action="store_true", help="smaller documents and fewer pages per timing")
+    p.add_argument("--work-dir", help="keep the generated PDFs and outputs here instead of a temp folder")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    p.set_defaults(func=cli_bench)
+    return parser
+
+def run_gui(timing=False, trace_path=None):
     root = tk.Tk()
-    app = PDFReader(root)
+    app = PDFReader(root, timing, trace_path)
     root.protocol("WM_DELETE_WINDOW", app.on_close)
-    root.mainloop()
\ No newline at end of file
+    try:
+        root.mainloop()
+    finally:
+        app.renderer.shutdown()  # idle render processes would otherwise hold up interpreter exit
+    return 0
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command: return args.func(args)
+    return run_gui(args.timing, args.trace)
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import os
+
+import pytest
+
+import pdf_reader
+from pdf_reader import WatchService, make_synthetic_pdf, run_watch_job
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """A watch tree given as a relative path, the way `pdf_reader.py watch jobs` gets it"""
+    monkeypatch.chdir(tmp_path)
+    for d in ("inbox", "out"): os.makedirs(os.path.join("w", d))
+    return "w"
+
+def drop_pdf(root, name, pages):
+    path = os.path.join(root, "inbox", name)
+    make_synthetic_pdf("plain", path, pages)
+    return path
+
+def drop_manifest(root, name, job):
+    with open(os.path.join(root, "inbox", name), "w", encoding="utf-8") as f: json.dump(job, f)
+
+def run_once(root, **kw):
+    service = WatchService(root, settle=0, log=lambda msg: None, **kw)
+    return service, service.run(interval=0.05, once=True)
+
+def journal(root):
+    with open(os.path.join(root, "jobs.jsonl"), encoding="utf-8") as f: return [json.loads(line) for line in f]
+
+
+def test_run_watch_job_splits_a_dropped_pdf(root):
+    job = drop_pdf(root, "scan.pdf", 5)
+    stats = run_watch_job(job, os.path.join(root, "inbox"), os.path.join(root, "out"), every=2)
+    assert stats["kind"] == "split" and stats["pages"] == 5
+    assert len(stats["outputs"]) == 3 and all(os.path.exists(p) for p in stats["outputs"])
+
+def test_run_watch_job_rejects_a_manifest_without_work(root):
+    drop_manifest(root, "odd.json", {"output": "x"})
+    with pytest.raises(ValueError):
+        run_watch_job(os.path.join(root, "inbox", "odd.json"), os.path.join(root, "inbox"), os.path.join(root, "out"))
+
+def test_once_runs_merge_split_and_dropped_jobs(root):
+    os.makedirs(os.path.join(root, "inbox", "parts"))
+    for n in range(2): make_synthetic_pdf("plain", os.path.join(root, "inbox", "parts", f"{n}.pdf"), 3)
+    drop_manifest(root, "merge.json", {"merge": ["parts/0.pdf", "parts/1.pdf"], "output": "../../both.pdf"})
+    drop_manifest(root, "split.json", {"split": "parts/0.pdf", "ranges": "1-2,3"})
+    drop_pdf(root, "dropped.pdf", 4)
+    drop_manifest(root, "broken.json", {"merge": ["missing.pdf"]})
+    service, summary = run_once(root, workers=1)
+
+    assert summary["jobs"] == 4 and summary["failed"] == 1
+    with pdf_reader.fitz.open(os.path.join(root, "out", "both.pdf")) as doc: assert len(doc) == 6
+    # Output folders are named after the claimed job file, which carries the claim time
+    folders = {name.split("-", 2)[-1]: os.path.join(root, "out", name) for name in os.listdir(os.path.join(root, "out"))}
+    assert len(os.listdir(folders["split"])) == 2
+    assert len(os.listdir(folders["dropped"])) == 4
+    records = {r["job"].split("-", 2)[-1]: r for r in journal(root)}
+    assert records["broken.json"]["status"] == "failed"
+    assert os.listdir(os.path.join(root, "failed"))[0].endswith("broken.json")
+    assert len(os.listdir(os.path.join(root, "done"))) == 3
+    assert os.listdir(os.path.join(root, "inbox")) == ["parts"]
+    assert os.listdir(os.path.join(root, "work")) == []
+
+def test_claims_stop_when_the_queue_is_full(root):
+    for n in range(5): drop_pdf(root, f"{n}.pdf", 1)
+    service = WatchService(root, workers=1, queue_limit=1, settle=0)
+    service.take_work_dir()
+    ready, _ = service.scan()
+    assert service.claim_ready(ready, in_flight=4) == []
+    assert len(service.claim_ready(ready, in_flight=0)) == 2
+    assert len(os.listdir(os.path.join(root, "inbox"))) == 3
+    service.release_work_dir()
+
+def test_jobs_of_a_live_instance_are_left_alone(root):
+    drop_pdf(root, "a.pdf", 2)
+    first = WatchService(root, settle=0)
+    first.take_work_dir()
+    claimed = first.claim("a.pdf")
+
+    second, summary = run_once(root, workers=1)
+    assert summary["jobs"] == 0 and os.path.exists(claimed)
+
+    # Once the owner is gone its queued job is adopted and runs exactly once
+    first.release_work_dir()
+    third, summary = run_once(root, workers=1)
+    assert summary["jobs"] == 1 and summary["failed"] == 0
+    assert len(journal(root)) == 1 and os.listdir(os.path.join(root, "work")) == []
+
+def test_manifest_lists_resolve_from_their_own_folder(root):
+    batch = os.path.join(root, "inbox", "batch")
+    os.makedirs(batch)
+    for name in ("a.pdf", "b.pdf"): make_synthetic_pdf("plain", os.path.join(batch, name), 2)
+    with open(os.path.join(batch, "list.txt"), "w", encoding="utf-8") as f: f.write("# order\nb.pdf\na.pdf\n")
+    drop_manifest(root, "listed.json", {"merge": ["@batch/list.txt"], "output": "listed.pdf"})
+    stats = run_watch_job(os.path.join(root, "inbox", "listed.json"), os.path.abspath(os.path.join(root, "inbox")),
+                          os.path.join(root, "out"))
+    assert stats["pages"] == 4
+
+def test_an_instance_folder_still_being_set_up_is_left_alone(root):
+    # Another instance that has created its folder but not yet taken the lock
+    starting = os.path.join(root, "work", ".host-1-abc")
+    os.makedirs(starting)
+    open(os.path.join(starting, ".lock"), "w").close()
+    service = WatchService(root, settle=0)
+    assert service.take_work_dir() == []
+    assert os.path.exists(os.path.join(starting, ".lock"))
+    assert not os.path.basename(service.work).startswith(".")
+    service.release_work_dir()
+
+def test_a_job_that_kills_its_worker_fails_alone(root, monkeypatch):
+    # Workers are forked, so they see the patched merge: "crash.pdf" takes the process down
+    merge = pdf_reader.merge_pdfs
+    def crashing_merge(inputs, *args, **kw):
+        if any(p.endswith("crash.pdf") for p in inputs): os._exit(1)
+        return merge(inputs, *args, **kw)
+    monkeypatch.setattr(pdf_reader, "merge_pdfs", crashing_merge)
+    for name in ("crash.pdf", "ok.pdf"): make_synthetic_pdf("plain", os.path.join(root, "inbox", name), 2)
+    os.rename(os.path.join(root, "inbox", "crash.pdf"), os.path.join(root, "crash.pdf"))
+    os.rename(os.path.join(root, "inbox", "ok.pdf"), os.path.join(root, "ok.pdf"))
+    drop_manifest(root, "bad.json", {"merge": ["../crash.pdf"]})
+    for n in range(3): drop_manifest(root, f"good{n}.json", {"merge": ["../ok.pdf"]})
+    drop_pdf(root, "later.pdf", 2)
+    service, summary = run_once(root, workers=2)
+
+    assert summary["jobs"] == 5 and summary["failed"] == 1
+    assert [r["job"] for r in journal(root) if r["status"] == "failed"][0].endswith("bad.json")
+    assert len(os.listdir(os.path.join(root, "done"))) == 4
+    assert os.listdir(os.path.join(root, "work")) == [] and os.listdir(os.path.join(root, "inbox")) == []